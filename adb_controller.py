@@ -1,60 +1,370 @@
 # adb_controller.py
 import subprocess
 import time
-from config import ADB_PATH, WAIT_TIME, FULL_SCREENSHOT_PATH
+from config import (ADB_PATH, WAIT_TIME, FULL_SCREENSHOT_PATH, SCREENSHOT_MODE, SCREENSHOT_RETURN,
+                    INPUT_MODE, SHELL_TIMEOUT, DEVICE_SERIALS, ADB_CONNECT_TIMEOUT)
 from PIL import Image
+import numpy as np
+import struct
 import io
-DEVICE_SERIAL = '127.0.0.1:16384' 
+import queue
+import atexit
+import threading
+from collections import deque
+from metrics import get_metrics
+# Default device for calls that do not pass a serial
+DEVICE_SERIAL = DEVICE_SERIALS[0]
 
+# screencap 原始输出的像素格式（android PixelFormat），只支持每像素 4 字节的 RGBA 系列
+RAW_PIXEL_FORMATS = {
+    1: 'RGBA',  # RGBA_8888
+    2: 'RGBX',  # RGBX_8888
+}
 
-def connect_device():
+
+def connect_device(serial=DEVICE_SERIAL, timeout=ADB_CONNECT_TIMEOUT):
     """
-    Connect to Android emulator/device via ADB.
+    Connect to Android emulator/device via ADB, giving up after `timeout` seconds.
+
+    Called explicitly (importing this module has no side effects). USB serials
+    need no connect. Returns True when adb reports the device as connected.
     """
+    if ':' not in serial:
+        return True
     try:
-        subprocess.run([ADB_PATH, 'connect', '127.0.0.1:16384'], check=True)
-        print("Connected to Android emulator at 127.0.0.1:16384")
-        # subprocess.run([ADB_PATH, 'connect', '127.0.0.1:16416'], check=True)
-        # print("Connected to Android emulator at 127.0.0.1:16416")
-    except subprocess.CalledProcessError as e:
+        result = subprocess.run([ADB_PATH, 'connect', serial], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, timeout=timeout, check=True)
+    except subprocess.TimeoutExpired:
+        print(f"Error connecting via ADB: no answer from {serial} within {timeout}s")
+        return False
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"Error connecting via ADB: {e}")
+        return False
+    # adb exits 0 on failure too; success reads "connected to" / "already connected to"
+    output = result.stdout.decode(errors='replace').strip()
+    if 'connected to' not in output:
+        print(f"Error connecting via ADB: {output}")
+        return False
+    print(f"Connected to Android emulator at {serial}")
+    return True
+
+
+def parse_raw_frame(data):
+    """
+    Parse the output of a plain `screencap` (no -p) into a (H, W, 4) uint8 array.
+
+    The header is width, height, format (and, on newer Android, a colour space
+    word), all little-endian uint32. The returned array is a read-only view
+    into `data`; no pixel bytes are copied.
+    """
+    if len(data) < 12:
+        raise ValueError(f"raw screencap output too short ({len(data)} bytes)")
+    width, height, fmt = struct.unpack_from('<3I', data, 0)
+    if fmt not in RAW_PIXEL_FORMATS:
+        raise ValueError(f"unsupported screencap pixel format {fmt}")
+    frame_size = width * height * 4
+    # 头部长度随系统版本不同（12 或 16 字节），用总长度反推
+    header_size = len(data) - frame_size
+    if header_size not in (12, 16):
+        raise ValueError(
+            f"unexpected screencap size {len(data)} for {width}x{height} frame")
+    return np.frombuffer(data, dtype=np.uint8, count=frame_size,
+                         offset=header_size).reshape(height, width, 4)
+
+
+def frame_to_image(frame):
+    """
+    Wrap a (H, W, 4) uint8 array as an RGBA PIL Image sharing the same memory.
+    """
+    height, width = frame.shape[:2]
+    return Image.frombuffer('RGBA', (width, height), frame, 'raw', 'RGBA', 0, 1)
+
+
+def capture_png(serial=None):
+    """
+    Capture a PNG-encoded screenshot and return the decoded PIL Image.
+    """
+    result = subprocess.run(
+        [ADB_PATH, '-s', serial or DEVICE_SERIAL,  'exec-out', 'screencap', '-p'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    img = Image.open(io.BytesIO(result.stdout))
+    img.load()
+    return img
 
-# Automatically connect when module is imported
-connect_device()
 
-def take_screenshot():
+def capture_raw(serial=None):
     """
-    Capture a screenshot from the connected Android emulator/device and return a PIL Image.
+    Capture the raw framebuffer and return it as a (H, W, 4) uint8 array.
     """
-    # Use adb exec-out to capture screen in PNG format
+    result = subprocess.run(
+        [ADB_PATH, '-s', serial or DEVICE_SERIAL, 'exec-out', 'screencap'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return parse_raw_frame(result.stdout)
+
+
+def take_screenshot(mode=None, as_array=None, serial=None):
+    """
+    Capture a screenshot from the connected Android emulator/device.
+
+    `mode` is 'png' or 'raw' (defaults to config.SCREENSHOT_MODE). The result is a
+    PIL Image unless `as_array` (defaults to config.SCREENSHOT_RETURN == 'array')
+    asks for a numpy array. `serial` selects the device (default DEVICE_SERIAL).
+    Returns None on failure.
+    """
+    mode = mode or SCREENSHOT_MODE
+    if as_array is None:
+        as_array = SCREENSHOT_RETURN == 'array'
+    metrics = get_metrics()
     try:
-        result = subprocess.run(
-            [ADB_PATH, '-s', DEVICE_SERIAL,  'exec-out', 'screencap', '-p'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
-        img_data = result.stdout
-        img = Image.open(io.BytesIO(img_data))
-        # Optionally save to file
-        return img
-    except subprocess.CalledProcessError as e:
+        with metrics.timer('adb_screenshot_seconds', mode=mode):
+            if mode == 'raw':
+                frame = capture_raw(serial)
+                return frame if as_array else frame_to_image(frame)
+            img = capture_png(serial)
+            return np.asarray(img) if as_array else img
+    except (subprocess.CalledProcessError, ValueError) as e:
+        metrics.inc('adb_errors_total', op='screenshot')
         print(f"Error taking screenshot: {e}")
         return None
 
 
-def tap(x, y):
+class AdbShell:
+    """
+    A long-lived `adb shell` process that input commands are written to over stdin.
+
+    Each batch of commands is followed by an `echo` marker so the caller can wait
+    for completion and measure latency. If the process dies or a command times
+    out, the session is restarted once before the error is raised.
+    """
+
+    def __init__(self, serial=DEVICE_SERIAL, timeout=SHELL_TIMEOUT):
+        self.serial = serial
+        self.timeout = timeout
+        self.latencies = deque(maxlen=500)
+        self.commands = 0
+        self.restarts = 0
+        self._proc = None
+        self._lines = None
+        self._started = False
+        self._pending = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._started:
+            self.restarts += 1
+        self._started = True
+        self._proc = subprocess.Popen(
+            [ADB_PATH, '-s', self.serial, 'shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0
+        )
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_lines,
+                                  args=(self._proc.stdout, self._lines), daemon=True)
+        reader.start()
+
+    @staticmethod
+    def _read_lines(stream, lines):
+        for line in iter(stream.readline, b''):
+            lines.put(line)
+        lines.put(None)  # EOF：shell 已退出
+
+    def alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _execute(self, command):
+        self._seq += 1
+        marker = f'__CAA_DONE_{self._seq}__'.encode()
+        self._proc.stdin.write(command.encode() + b'; echo ' + marker + b'\n')
+        self._proc.stdin.flush()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"adb shell did not answer within {self.timeout}s")
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if line is None:
+                raise BrokenPipeError("adb shell exited")
+            if line.strip() == marker:
+                return
+
+    def run(self, command):
+        """
+        Run `command` in the shell, wait for it to finish and return the latency in seconds.
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    # a failed (re)start goes through the same retry and RuntimeError path
+                    if not self.alive():
+                        self._start()
+                    start = time.perf_counter()
+                    self._execute(command)
+                except (OSError, TimeoutError) as e:
+                    self.close()
+                    if attempt == 1:
+                        raise RuntimeError(f"adb shell command failed: {command!r}: {e}")
+                    continue
+                latency = time.perf_counter() - start
+                self.commands += 1
+                self.latencies.append(latency)
+                return latency
+
+    def queue_tap(self, x, y, delay=0.0):
+        """
+        Queue a tap; `delay` seconds are slept on the device before it.
+        """
+        if delay > 0:
+            self._pending.append(f'sleep {delay:g}')
+        self._pending.append(f'input tap {x} {y}')
+
+    def flush(self):
+        """
+        Send all queued taps as one shell line. Returns the latency, or 0.0 if nothing was queued.
+        """
+        if not self._pending:
+            return 0.0
+        command = '; '.join(self._pending)
+        self._pending.clear()
+        return self.run(command)
+
+    def stats(self):
+        """
+        Return per-command latency statistics (milliseconds) and the restart count.
+        """
+        lat = sorted(self.latencies)
+        if not lat:
+            return {'commands': self.commands, 'restarts': self.restarts}
+        return {
+            'commands': self.commands,
+            'restarts': self.restarts,
+            'mean_ms': sum(lat) / len(lat) * 1000,
+            'p50_ms': lat[len(lat) // 2] * 1000,
+            'max_ms': lat[-1] * 1000,
+        }
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+_shells = {}
+_shells_lock = threading.Lock()
+
+
+def get_shell(serial=None):
+    """
+    Return the persistent shell session of `serial` (default DEVICE_SERIAL), creating it on first use.
+    """
+    serial = serial or DEVICE_SERIAL
+    with _shells_lock:
+        shell = _shells.get(serial)
+        if shell is None:
+            shell = _shells[serial] = AdbShell(serial)
+            atexit.register(shell.close)
+        return shell
+
+
+def tap(x, y, serial=None):
     """
     Simulate a tap on the device at (x, y).
     """
+    metrics = get_metrics()
+    if INPUT_MODE == 'shell':
+        try:
+            shell = get_shell(serial)
+            shell.queue_tap(x, y)
+            with metrics.timer('adb_input_seconds', kind='tap'):
+                shell.flush()
+        except RuntimeError as e:
+            metrics.inc('adb_errors_total', op='tap')
+            print(f"Error tapping at ({x}, {y}): {e}")
+        return
     try:
-        subprocess.run([ADB_PATH, '-s', DEVICE_SERIAL, 'shell', 'input', 'tap', str(x), str(y)], check=True)
+        with metrics.timer('adb_input_seconds', kind='tap'):
+            subprocess.run([ADB_PATH, '-s', serial or DEVICE_SERIAL, 'shell', 'input', 'tap', str(x), str(y)],
+                           check=True)
     except subprocess.CalledProcessError as e:
+        metrics.inc('adb_errors_total', op='tap')
         print(f"Error tapping at ({x}, {y}): {e}")
 
 
+def double_tap(x, y, interval=0.2, serial=None):
+    """
+    Tap (x, y) twice, `interval` seconds apart.
+    """
+    if INPUT_MODE == 'shell':
+        metrics = get_metrics()
+        try:
+            shell = get_shell(serial)
+            shell.queue_tap(x, y)
+            shell.queue_tap(x, y, delay=interval)
+            with metrics.timer('adb_input_seconds', kind='double_tap'):
+                shell.flush()
+        except RuntimeError as e:
+            metrics.inc('adb_errors_total', op='double_tap')
+            print(f"Error tapping at ({x}, {y}): {e}")
+        return
+    tap(x, y, serial)
+    time.sleep(interval)
+    tap(x, y, serial)
+
+
+def input_latency_stats(serial=None):
+    """
+    Per-command latency statistics of the persistent shell of `serial` ({} when it is not used).
+    """
+    shell = _shells.get(serial or DEVICE_SERIAL)
+    return shell.stats() if shell is not None else {}
+
+
 def wait():
     """
     Wait for a predefined amount of time.
     """
-    time.sleep(WAIT_TIME) 
\ No newline at end of file
+    time.sleep(WAIT_TIME)
+
+
+def benchmark_screenshot(n=20):
+    """
+    Compare per-frame latency of the PNG and raw capture paths on the live device.
+    """
+    for mode in ('png', 'raw'):
+        take_screenshot(mode)  # 预热一次，排除首次连接开销
+        times = []
+        for _ in range(n):
+            start = time.perf_counter()
+            img = take_screenshot(mode)
+            times.append(time.perf_counter() - start)
+            if img is None:
+                print(f"[{mode}] capture failed, aborting benchmark")
+                return
+        times.sort()
+        print(f"[{mode}] n={n} mean={sum(times) / n * 1000:.1f}ms "
+              f"p50={times[n // 2] * 1000:.1f}ms min={times[0] * 1000:.1f}ms "
+              f"max={times[-1] * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    connect_device()
+    benchmark_screenshot()
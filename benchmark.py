@@ -0,0 +1,240 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+import cv2
+from PIL import Image
+from config import (CARD_PATTERN_DIR, LEFT_BOTTOM_REGIONS, RIGHT_BOTTOM_REGIONS,
+                    BENCHMARK_BASELINE, BENCHMARK_OUTPUT, BENCHMARK_THRESHOLD)
+
+# 默认的截图语料目录：递归查找其中的全屏截图、卡槽截图和数字截图
+CORPUS_DIRS = ('backup', 'captures')
+
+# 参与回归判断的指标；变化量小于对应下限的不算回归（微秒级阶段的计时抖动）
+REGRESSION_METRICS = {'p50_ms': 0.05, 'p95_ms': 0.1, 'alloc_peak_kb': 16}
+
+
+def load_corpus(dirs=CORPUS_DIRS):
+    """
+    读取语料：全屏截图（转成与 raw 截图相同的 RGBA 数组）、卡槽截图、数字截图。
+    """
+    def find(pattern):
+        return sorted({p for d in dirs for p in glob.glob(os.path.join(d, '**', pattern), recursive=True)})
+
+    frames = [np.asarray(Image.open(p).convert('RGBA')) for p in find('*full_screenshot.png')]
+    slots = [np.asarray(Image.open(p).convert('RGB')) for p in find('*_masked.png')]
+    numbers = [np.asarray(Image.open(p).convert('RGB')) for p in find('*_num_*.png')]
+    return {'frames': frames, 'slots': slots, 'numbers': numbers}
+
+
+def build_stages(corpus):
+    """
+    返回 {阶段名: (样本列表, 单次调用函数)}。每次调用处理一个样本。
+    """
+    from image_processor import crop_regions, mask_circle, get_extractor
+    from recognizer import match_pattern, ocr_number
+    from slot_classifier import SlotClassifier
+    from digit_reader import DigitReader
+    from mode_detector import ModeDetector
+    from recognition_cache import RecognitionCache
+
+    extractor = get_extractor()
+    frames = corpus['frames']
+    slot_regions = LEFT_BOTTOM_REGIONS + RIGHT_BOTTOM_REGIONS
+    frame_images = [Image.fromarray(frame) for frame in frames]
+    slot_batches = [extractor.slots(frame) for frame in frames]
+    classifier = SlotClassifier(cache=False)
+    cached = SlotClassifier(cache=False)
+    cached.cache = RecognitionCache('benchmark', cached.bank, cache_dir=None)
+    detector = ModeDetector(gate=False, cache=False)
+    reader = DigitReader()
+
+    stages = {
+        # 旧的 PIL 路径：裁剪 6 个卡槽并逐个 mask_circle（每次一整帧）
+        'mask_circle': (frame_images, lambda img: [mask_circle(crop) for crop in crop_regions(img, slot_regions)]),
+        # RegionExtractor：一次切出 6 个卡槽（批量遮罩）和 6 个数字区域
+        'extract': (frames, lambda frame: (extractor.slots(frame), extractor.nums(frame))),
+        # 单个卡槽逐模板 matchTemplate
+        'match_pattern': (corpus['slots'], lambda crop: match_pattern(crop, CARD_PATTERN_DIR, important=0)),
+        # 一帧 6 个卡槽批量识别，不用缓存 / 用内存中的识别缓存
+        'classify': (slot_batches, classifier.classify),
+        'classify_cached': (slot_batches, cached.classify),
+        # 单个数字区域：逐模板匹配 / 连通域识别
+        'ocr_number': (corpus['numbers'], ocr_number),
+        'digit_reader': (corpus['numbers'], reader.read),
+        # 模式区域识别（不经过画面变化检测和缓存）
+        'mode_detect': (frames, lambda frame: detector.detect(extractor.mode(frame))),
+    }
+    capture = capture_stage()
+    if capture is not None:
+        stages['capture'] = (frames, capture)
+    return {name: stage for name, stage in stages.items() if stage[0]}
+
+
+def capture_stage():
+    """
+    完整的 card_capture.main（调试截图、异常导出和运行指标都关闭，避免往语料目录里写文件）。
+    card_capture 导入失败时跳过这一阶段。
+    """
+    try:
+        import card_capture
+    except Exception as e:
+        print(f"skip capture: card_capture unavailable ({e})")
+        return None
+    from debug_writer import DebugWriter, set_debug_writer
+    from frame_ring import FrameRing, set_ring
+    from metrics import NullMetrics, set_metrics
+    set_debug_writer(DebugWriter('off'))
+    set_metrics(NullMetrics())
+    set_ring(FrameRing(writer=DebugWriter('off')))
+    return card_capture.main
+
+
+def measure(items, fn, repeat):
+    """
+    先对每个样本调用一次预热，再计时 repeat 轮；最后单独开 tracemalloc 跑一轮统计内存分配。
+    tracemalloc 只统计 Python 对象和 NumPy 数组，PIL、OpenCV 内部的缓冲区不计入。
+    """
+    errors = 0
+    for item in items:
+        try:
+            fn(item)
+        except Exception:
+            errors += 1
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter_ns()
+            try:
+                fn(item)
+            except Exception:
+                errors += 1
+            samples.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - start
+
+    peaks, nets = [], []
+    tracemalloc.start()
+    try:
+        for item in items:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                fn(item)
+            except Exception:
+                pass
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            nets.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    ms = np.array(samples) / 1e6
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'calls': len(samples),
+        'errors': errors,
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'throughput_per_s': round(len(samples) / elapsed, 2) if elapsed > 0 else None,
+        'alloc_peak_kb': round(float(np.mean(peaks)) / 1024, 2),
+        'alloc_max_kb': round(float(np.max(peaks)) / 1024, 2),
+        'alloc_net_kb': round(float(np.mean(nets)) / 1024, 2),
+    }
+
+
+def run(corpus_dirs=CORPUS_DIRS, repeat=5, only=None):
+    corpus = load_corpus(corpus_dirs)
+    stages = build_stages(corpus)
+    if only:
+        unknown = set(only) - set(stages)
+        if unknown:
+            raise ValueError(f"unknown or empty stages: {sorted(unknown)}")
+        stages = {name: stages[name] for name in only}
+    results = {}
+    for name, (items, fn) in stages.items():
+        results[name] = measure(items, fn, repeat)
+        r = results[name]
+        print(f"{name:16s} n={r['calls']:5d}  p50 {r['p50_ms']:9.3f}ms  p95 {r['p95_ms']:9.3f}ms  "
+              f"p99 {r['p99_ms']:9.3f}ms  {r['throughput_per_s']:10.1f}/s  "
+              f"alloc {r['alloc_peak_kb']:9.1f}KB" + (f"  errors {r['errors']}" if r['errors'] else ''))
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'corpus': {key: len(value) for key, value in corpus.items()},
+        },
+        'stages': results,
+    }
+
+
+def compare(result, baseline, threshold=BENCHMARK_THRESHOLD):
+    """
+    与基线比较，返回回归列表 [(阶段, 指标, 基线值, 当前值), ...]：
+    指标超过基线的 (1 + threshold) 倍，且增加量超过 REGRESSION_METRICS 中的下限。
+    """
+    regressions = []
+    for name, current in result['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if base is None:
+            continue
+        for metric, floor in REGRESSION_METRICS.items():
+            old, new = base.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > floor:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the recognition stages over stored screenshots.')
+    parser.add_argument('--corpus', nargs='+', default=list(CORPUS_DIRS), help='screenshot directories')
+    parser.add_argument('--repeat', type=int, default=5, help='timed passes over the corpus per stage')
+    parser.add_argument('--stages', help='comma-separated stage names (default: all)')
+    parser.add_argument('--output', default=BENCHMARK_OUTPUT, help='where to write the JSON results')
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=BENCHMARK_THRESHOLD,
+                        help='allowed relative slowdown before a stage counts as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    args = parser.parse_args(argv)
+
+    only = args.stages.split(',') if args.stages else None
+    result = run(args.corpus, args.repeat, only)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(result, baseline, args.threshold)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name}.{metric}: {old} -> {new} (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
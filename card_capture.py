@@ -1,82 +1,93 @@
-import os
-from adb_controller import take_screenshot
-from image_processor import crop_regions, mask_circle
-from config import LEFT_BOTTOM_REGIONS, RIGHT_BOTTOM_REGIONS, LEFT_BOTTOM_NUMS, RIGHT_BOTTOM_NUMS
-from recognizer import match_pattern, ocr_number
-from config import CARD_PATTERN_DIR, CARD_OUTPUT_DIR 
+from device import get_device
+from image_processor import get_extractor, as_frame
+from config import LEFT_BOTTOM_REGIONS
+from recognizer import resolve_match
+from digit_reader import get_digit_reader
+from slot_classifier import get_classifier
+from debug_writer import get_debug_writer
+from frame_ring import get_ring
+from metrics import get_metrics
+from config import CARD_OUTPUT_DIR 
 
-def main():
-    # Prepare output directory
-    output_dir = CARD_OUTPUT_DIR
-    os.makedirs(output_dir, exist_ok=True)
+def main(img=None, output_dir=None):
+    # Debug images go to CARD_OUTPUT_DIR unless the caller (a device worker) has its own directory
+    output_dir = output_dir or CARD_OUTPUT_DIR
 
-    # Take a screenshot
-    img = take_screenshot()
+    # Take a screenshot unless the caller already has a fresh frame
+    if img is None:
+        img = get_device().screenshot()
     if img is None:
         print('Failed to take screenshot')
         # Return empty slot info lists to indicate failure
         return [], []
 
-    # Save full screenshot
-    full_path = os.path.join(output_dir, 'full_screenshot.png')
-    img.save(full_path)
-    # print(f'Saved full screenshot to {full_path}')
-
-    # Crop and save left bottom regions
-    left_crops = crop_regions(img, LEFT_BOTTOM_REGIONS)
-    left_masked = []
-    for idx, crop in enumerate(left_crops, start=1):
-        masked_img = mask_circle(crop)
-        left_masked.append(masked_img)
-        path = os.path.join(output_dir, f'left_{idx}_masked.png')
-        masked_img.save(path)
-        # print(f'Saved masked left region {idx} to {path}')
-        
+    # Slice all regions out of one frame array: the six slots come back as a single masked
+    # (6, h, w, 3) batch, the numeric regions as views into the frame
+    metrics = get_metrics()
+    extractor = get_extractor()
+    with metrics.stage('extract'):
+        frame = as_frame(img)
+        slots = extractor.slots(frame)
+        nums = extractor.nums(frame)
+    split = len(LEFT_BOTTOM_REGIONS)
+    left_masked, right_masked = list(slots[:split]), list(slots[split:])
+    left_num_crops, right_num_crops = nums[:split], nums[split:]
 
-    # Crop and save right bottom regions
-    right_crops = crop_regions(img, RIGHT_BOTTOM_REGIONS)
-    right_masked = []
-    for idx, crop in enumerate(right_crops, start=1):
-        masked_img = mask_circle(crop)
-        right_masked.append(masked_img)
-        path = os.path.join(output_dir, f'right_{idx}_masked.png')
-        masked_img.save(path)
-        # print(f'Saved masked right region {idx} to {path}')
-
-    # Crop and save left bottom numeric regions
-    left_num_crops = crop_regions(img, LEFT_BOTTOM_NUMS)
+    # Hand the debug images to the background writer (off / async / sampled, see config.py)
+    debug_images = {'full_screenshot.png': img}
+    for idx, crop in enumerate(left_masked, start=1):
+        debug_images[f'left_{idx}_masked.png'] = crop
+    for idx, crop in enumerate(right_masked, start=1):
+        debug_images[f'right_{idx}_masked.png'] = crop
     for idx, crop in enumerate(left_num_crops, start=1):
-        path = os.path.join(output_dir, f'left_num_{idx}.png')
-        crop.save(path)
-        # print(f'Saved left bottom number region {idx} to {path}')
-
-    # Crop and save right bottom numeric regions
-    right_num_crops = crop_regions(img, RIGHT_BOTTOM_NUMS)
+        debug_images[f'left_num_{idx}.png'] = crop
     for idx, crop in enumerate(right_num_crops, start=1):
-        path = os.path.join(output_dir, f'right_num_{idx}.png')
-        crop.save(path)
-        # print(f'Saved right bottom number region {idx} to {path}')
+        debug_images[f'right_num_{idx}.png'] = crop
+    get_debug_writer().submit(output_dir, debug_images)
 
-    # Match slot patterns to get names and counts for left side
-    left_slot_info = []
-    for idx, crop in enumerate(left_masked):
-        name = match_pattern(crop, CARD_PATTERN_DIR, 1)
-        count = None
-        if idx < len(left_num_crops):
-            count = ocr_number(left_num_crops[idx])
-        left_slot_info.append((name, count))
+    # Keep the round in the in-memory ring; it is only written out if something looks wrong
+    ring = get_ring()
+    ring.record(debug_images)
+    try:
+        # Match all six slot crops against the slot templates in one batch
+        with metrics.stage('classify'):
+            matches = get_classifier().classify(slots)
+        ring.update(matches=[(name, round(score, 4)) for name, score in matches])
+        try:
+            names = [resolve_match(name, score, 0.8, 1) for name, score in matches]
+        except Exception:
+            ring.flag('no_card_match')
+            raise
+        left_names, right_names = names[:len(left_masked)], names[len(left_masked):]
 
-    # Match slot patterns to get names and counts for right side
-    right_slot_info = []
-    for idx, crop in enumerate(right_masked):
-        name = match_pattern(crop, CARD_PATTERN_DIR, 1)
-        count = None
-        if idx < len(right_num_crops):
-            count = ocr_number(right_num_crops[idx])
-        right_slot_info.append((name, count))
+        # Read the counts with the connected-component digit reader (template matching as fallback)
+        reader = get_digit_reader()
+        with metrics.stage('ocr'):
+            # Pair slot names with counts for left side
+            left_slot_info = []
+            for idx, name in enumerate(left_names):
+                count = None
+                if idx < len(left_num_crops):
+                    count = reader.read(left_num_crops[idx])
+                left_slot_info.append((name, count))
 
-    return left_slot_info, right_slot_info
+            # Pair slot names with counts for right side
+            right_slot_info = []
+            for idx, name in enumerate(right_names):
+                count = None
+                if idx < len(right_num_crops):
+                    count = reader.read(right_num_crops[idx])
+                right_slot_info.append((name, count))
 
+        ring.update(left=left_slot_info, right=right_slot_info)
+        for side, info in (('left', left_slot_info), ('right', right_slot_info)):
+            for idx, (name, count) in enumerate(info, start=1):
+                if count == 999:
+                    ring.flag('ocr_999', slot=f'{side}_{idx}', name=name)
+                    metrics.inc('ocr_999_total')
+        return left_slot_info, right_slot_info
+    finally:
+        ring.finish()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,56 @@
+from collections import defaultdict
+import cv2
+import numpy as np
+from config import FRAME_DIFF_THRESHOLD
+
+# 比较前把区域缩小到的尺寸 (宽, 高)
+DIFF_SIZE = (32, 16)
+
+
+def thumbnail(img, size=DIFF_SIZE) -> np.ndarray:
+    """
+    把 PIL.Image / numpy 图像缩成小尺寸灰度图，用于廉价的帧间比较。
+    """
+    arr = np.asarray(img)
+    if arr.ndim == 3:
+        arr = cv2.cvtColor(np.ascontiguousarray(arr[:, :, :3]), cv2.COLOR_RGB2GRAY)
+    return cv2.resize(arr, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+class ChangeDetector:
+    """
+    按区域名记录上次识别时的缩略图，判断当前画面是否有实质变化。
+
+    参考帧只在判定为"有变化"时更新，因此缓慢的渐变也会在累计超过阈值后被发现。
+    """
+
+    def __init__(self, threshold=FRAME_DIFF_THRESHOLD, size=DIFF_SIZE):
+        self.threshold = threshold
+        self.size = size
+        self._reference = {}
+        self.checks = defaultdict(int)
+        self.skipped = defaultdict(int)
+
+    def changed(self, key, img):
+        """
+        区域 key 的画面与参考帧相比是否有变化；第一次调用总是返回 True。
+        """
+        self.checks[key] += 1
+        thumb = thumbnail(img, self.size)
+        ref = self._reference.get(key)
+        if ref is not None and ref.shape == thumb.shape:
+            if np.abs(thumb - ref).mean() <= self.threshold:
+                self.skipped[key] += 1
+                return False
+        self._reference[key] = thumb
+        return True
+
+    def reset(self, key=None):
+        if key is None:
+            self._reference.clear()
+        else:
+            self._reference.pop(key, None)
+
+    def stats(self):
+        return {key: {'checks': self.checks[key], 'skipped': self.skipped[key]}
+                for key in self.checks}
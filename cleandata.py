@@ -1,185 +1,187 @@
+import os
+import time
 import pandas as pd
 import numpy as np
-from typing import Optional, Dict, Any
-
-
-def report_removed_row(
-    df: pd.DataFrame,
-    idx: int,
-    label_col: Optional[str],
-    reason: str
-) -> Dict[str, Any]:
-    """
-    打印并返回被剔除行的信息和原因：
-      - 打印行的 label、剔除原因，以及该行的非零字段及其值（不含标签列）
-      - 返回包含 label、reason 和非零字段值的字典
-
-    参数:
-        df: 原始 DataFrame
-        idx: 行索引
-        label_col: 标签列名称（若为 None 则用行索引作为 label）
-        reason: 本次剔除的原因描述
-
-    返回:
-        dict: {
-          "label": 行标签,
-          "reason": 剔除原因,
-          "values": {字段: 值, ...}
-        }
-    """
-    row = df.loc[idx]
-    label = row[label_col] if (label_col and label_col in df.columns) else idx
-
-    # 取非零字段（排除标签列）
-    non_zero = row[row != 0]
-    if label_col and label_col in non_zero.index:
-        non_zero = non_zero.drop(label_col)
-
-    info = {
-        "label": label,
-        "reason": reason,
-        "values": non_zero.to_dict()
-    }
-    print(f"\n--- 剔除行 {label} 原因：{reason}")
-    print(f"    非零字段: {info['values']}")
-    return info
+from typing import Optional, Dict, Sequence, Tuple
 
+from dataset_store import load_dataframe, save_dataframe
+from row_index import find_redundant
 
-def clean_by_balance(
+# 逐块计算的行数，避免整个矩阵转成 float64 的临时数组
+CHUNK_ROWS = 262144
+
+# 清洗步骤，按顺序执行；每一步的统计量（列均值等）只在前面步骤保留下来的行上计算
+STAGES = ('balance', 'sign', 'duplicate', 'outlier')
+
+
+def nonzero_abs_mean(values: np.ndarray) -> np.ndarray:
+    """
+    各列非零值绝对值的均值，全为 0 的列为 NaN。
+    """
+    counts = (values != 0).sum(axis=0)
+    sums = np.abs(values).sum(axis=0, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def compact(values: np.ndarray) -> np.ndarray:
+    """
+    整数矩阵按取值范围转成 int16（CSV 读出来是 int64），减少大数据集的内存占用。
+    """
+    info = np.iinfo(np.int16)
+    if (np.issubdtype(values.dtype, np.integer) and len(values)
+            and info.min <= values.min() and values.max() <= info.max):
+        return values.astype(np.int16, copy=False)
+    return values
+
+
+def balance_mask(values: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每行 score = ∑(value / 列非零绝对值均值)，返回 (score 超出 [-threshold, +threshold] 的行, score)。
+    """
+    inv_mean = np.nan_to_num(1.0 / nonzero_abs_mean(values), nan=0.0, posinf=0.0)
+    scores = np.concatenate([values[i:i + CHUNK_ROWS] @ inv_mean
+                             for i in range(0, len(values), CHUNK_ROWS)]) if len(values) else np.zeros(0)
+    return (scores < -threshold) | (scores > threshold), scores
+
+
+def outlier_mask(values: np.ndarray, lower: float, upper: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    非零值的绝对值不在 [lower*均值, upper*均值] 的单元格所在行。
+    返回 (被剔除的行, 每行第一个越界的列, 各列下界, 各列上界)。
+    """
+    mean_abs = nonzero_abs_mean(values)
+    lo, hi = lower * mean_abs, upper * mean_abs
+    abs_values = np.abs(values)
+    violations = (values != 0) & ((abs_values < lo) | (abs_values > hi))
+    return violations.any(axis=1), violations.argmax(axis=1), lo, hi
+
+
+def clean(
     infile: str,
     outfile: str,
+    report_file: Optional[str] = None,
+    stages: Sequence[str] = STAGES,
     threshold: float = 1.0,
+    lower: float = 0.4,
+    upper: float = 2.5,
     label_col: Optional[str] = None
-) -> None:
+) -> Dict[str, int]:
     """
-    均衡清洗流程：
-      1. 读 CSV；
-      2. 各列绝对值均值（跳过 0）→ inv_mean；
-      3. 计算每行 score = ∑(value * inv_mean)；
-      4. 丢弃 score 超出 [-threshold, +threshold] 的行、打印原因和值；
-      5. 写出保留行。
+    单次读取、全部用数组运算完成的清洗流程：
+      balance   -- score 超出 [-threshold, +threshold] 的行（见 balance_mask）
+      sign      -- 全正数行、全负数行
+      duplicate -- 重复行、完全相反行（按符号归一化后的哈希分组，保留首次出现）
+      outlier   -- 有非零值绝对值不在 [lower*均值, upper*均值] 的行
+    保留行写入 outfile（CSV 或 .store），被剔除的行写入 report_file
+    （CSV：原始数据行号、步骤、原因，以及重复的首次出现行号 ref、score 或越界的列、值和区间），
+    返回各步骤剔除的行数。label_col 列不参与计算。
     """
-    df = pd.read_csv(infile)
-    print(f"\n=== clean_by_balance: 原始行数 = {len(df)} ===")
-
-    # 计算各列（非零）绝对值均值
-    mean_abs = df.replace(0, np.nan).abs().mean()
-    inv_mean = 1.0 / mean_abs.replace(0, np.nan)
-    inv_mean = inv_mean.fillna(0.0)
-
-    # 计算每行 score
-    scores = df.mul(inv_mean, axis=1).sum(axis=1)
-
-    # 筛选
-    keep_mask = scores.between(-threshold, threshold)
-    dropped_idx = df.index[~keep_mask]
+    start = time.time()
+    df = load_dataframe(infile)
+    feature_cols = [c for c in df.columns if c != label_col]
+    values = compact(df[feature_cols].to_numpy())
+    n = len(df)
+    alive = np.ones(n, dtype=bool)
+    stage_of = np.full(n, '', dtype=object)
+    reason_of = np.full(n, '', dtype=object)
+    # 报告里的数值明细：balance 的 score，outlier 第一个越界的列及其值和区间
+    score_of = np.full(n, np.nan)
+    col_of = np.full(n, -1)
+    bounds = np.full((n, 2), np.nan)
+    # duplicate 步骤：与之重复或相反的首次出现行号，其余为 -1
+    ref_of = np.full(n, -1)
+
+    def reject(rows, stage, reason):
+        stage_of[rows] = stage
+        reason_of[rows] = reason
+        alive[rows] = False
+
+    for stage in stages:
+        rows = np.flatnonzero(alive)
+        current = values[rows]
+        if stage == 'balance':
+            bad, scores = balance_mask(current, threshold)
+            score_of[rows[bad]] = scores[bad]
+            reject(rows[bad], stage, f"score 不在 [-{threshold}, +{threshold}]")
+        elif stage == 'sign':
+            reject(rows[(current > 0).all(axis=1)], stage, "全正数行")
+            reject(rows[(current < 0).all(axis=1)], stage, "全负数行")
+        elif stage == 'duplicate':
+            duplicate, mirror, first = find_redundant(current)
+            ref_of[rows[duplicate | mirror]] = rows[first[duplicate | mirror]]
+            reject(rows[duplicate], stage, "重复行")
+            reject(rows[mirror], stage, "完全相反行")
+        elif stage == 'outlier':
+            bad, first_col, lo, hi = outlier_mask(current, lower, upper)
+            col_of[rows[bad]] = first_col[bad]
+            bounds[rows[bad]] = np.stack([lo[first_col[bad]], hi[first_col[bad]]], axis=1)
+            reject(rows[bad], stage, f"非零值绝对值不在 [{lower}*均值, {upper}*均值]")
+        else:
+            raise ValueError(f"unknown stage: {stage}")
+
+    kept = df[alive]
+    save_dataframe(kept, outfile)
+
+    rejected = np.flatnonzero(~alive)
+    cols = col_of[rejected]
+    has_col = cols >= 0
+    report = pd.DataFrame({
+        'row': rejected,
+        'stage': stage_of[rejected],
+        'reason': reason_of[rejected],
+        'ref': ref_of[rejected],
+        'score': score_of[rejected],
+        'column': np.where(has_col, np.array(feature_cols + [''], dtype=object)[cols], ''),
+        'value': np.where(has_col, values[rejected, np.maximum(cols, 0)], np.nan),
+        'lower': bounds[rejected, 0],
+        'upper': bounds[rejected, 1],
+    })
+    if report_file is None:
+        report_file = f"{os.path.splitext(outfile)[0]}_rejected.csv"
+    report.round(4).to_csv(report_file, index=False)
+
+    counts = {stage: int((stage_of == stage).sum()) for stage in stages}
+    print(f"clean: 原始 {n} 行，剔除 {len(rejected)} 行 {counts}，保留 {len(kept)} 行，"
+          f"用时 {time.time() - start:.2f}s")
+    print(f"清洗后数据已写入: {outfile}，剔除明细: {report_file}")
+    return counts
 
-    # 打印剔除信息
-    removed_info = []
-    for idx in dropped_idx:
-        sc = scores.at[idx]
-        reason = f"score={sc:.4f} 不在 [-{threshold}, +{threshold}]"
-        removed_info.append(
-            report_removed_row(df, idx, label_col, reason)
-        )
 
-    kept = df[keep_mask]
-    print(f"\nclean_by_balance: 剔除 {len(removed_info)} 行，保留 {len(kept)} 行")
-    kept.to_csv(outfile, index=False)
-    print(f"清洗后数据已写入: {outfile}")
+def clean_by_balance(
+    infile: str,
+    outfile: str,
+    threshold: float = 1.0,
+    label_col: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    只做均衡清洗（clean 的 balance 步骤）。
+    """
+    return clean(infile, outfile, stages=('balance',), threshold=threshold, label_col=label_col)
 
 
 def clean_special_rows(
     infile: str,
     outfile: str,
     label_col: Optional[str] = None
-) -> None:
-    """
-    剔除全正行、全负行、重复行、完全相反行，
-    调用方式与 clean_verbose 完全一致：传入 infile/outfile/label_col，不返回，写文件并打印日志。
-    """
-    df = pd.read_csv(infile)
-    print(f"\n=== clean_special_rows: 原始行数 = {len(df)} ===")
-
-    # 1. 全正数行 & 全负数行
-    for cond, desc in [(df.gt(0).all(axis=1), "全正数行"),
-                       (df.lt(0).all(axis=1), "全负数行")]:
-        for idx in df.index[cond]:
-            report_removed_row(df, idx, label_col, desc)
-        df = df[~cond]
-
-    # 2. 重复行（保留首次出现）
-    dup_mask = df.duplicated(keep='first')
-    for idx in df.index[dup_mask]:
-        report_removed_row(df, idx, label_col, "重复行")
-    df = df[~dup_mask]
-
-    # 3. 完全相反行
-    # seen = set()
-    # to_drop = []
-    # for idx, row in df.iterrows():
-    #     tup = tuple(row.values)
-    #     opp_tup = tuple((-row.values).tolist())
-    #     if opp_tup in seen:
-    #         to_drop.append(idx)
-    #     else:
-    #         seen.add(tup)
-    # for idx in to_drop:
-    #     report_removed_row(df, idx, label_col, "完全相反行")
-    # if to_drop:
-    #     df = df.drop(index=to_drop)
-
-    print(f"\nremove_special_rows: 最终剩余行数 = {len(df)}")
-    df.to_csv(outfile, index=False)
-    print(f"清洗后数据已写入: {outfile}")
-
+) -> Dict[str, int]:
+    """
+    只剔除全正行、全负行、重复行、完全相反行（clean 的 sign、duplicate 步骤）。
+    """
+    return clean(infile, outfile, stages=('sign', 'duplicate'), label_col=label_col)
 
 
 def clean_verbose(
     infile: str,
     outfile: str,
     label_col: Optional[str] = None
-) -> None:
-    """
-    详细清洗流程：
-      1. 读 CSV；
-      2. 计算各列非零绝对值均值 → mean_abs；
-      3. 对每个单元格，若 val!=0 且 abs(val) 不在 [0.5*mean, 2.0*mean]，则剔除该行；
-      4. 剔除全正行、全负行、重复行、完全相反行，打印原因和值；
-      5. 写出最终结果。
-    """
-    df = pd.read_csv(infile)
-    print(f"\n=== clean_verbose: 原始行数 = {len(df)} ===")
-
-    # 各列非零绝对值均值
-    mean_abs = df.replace(0, pd.NA).abs().mean(skipna=True)
-    lower = 0.4 * mean_abs
-    upper = 2.5 * mean_abs
-
-    # 标记每行是否保留
-    keep_rows = pd.Series(True, index=df.index)
-
-    # 逐行逐列检查异常值
-    for idx, row in df.iterrows():
-        if not keep_rows.at[idx]:
-            continue
-        for col in df.columns:
-            m = mean_abs[col]
-            val = row[col]
-            if pd.isna(m) or val == 0:
-                continue
-            if not (lower[col] <= abs(val) <= upper[col]):
-                reason = (
-                    f"列'{col}' val={val} 不在区间"
-                    f"[{lower[col]:.3f}, {upper[col]:.3f}]"
-                )
-                report_removed_row(df, idx, label_col, reason)
-                keep_rows.at[idx] = False
-                break
+) -> Dict[str, int]:
+    """
+    只剔除含异常值的行（clean 的 outlier 步骤）。
+    """
+    return clean(infile, outfile, stages=('outlier',), label_col=label_col)
 
 
 if __name__ == "__main__":
-    # 示例调用
-    clean_by_balance("results.csv", "results1.csv", threshold=1.0, label_col="id")
-    clean_special_rows("results1.csv", "results1.csv", label_col="id")
-    clean_verbose("results1.csv", "results1.csv", label_col="id")
+    # 示例调用：一次读取完成全部步骤
+    clean("results.csv", "results1.csv", label_col="id")
@@ -40,6 +40,7 @@ MODE_REGION = (0, 0, 300, 100)
 # 点击后或循环等待时间（秒）
 WAIT_TIME = 1 
 
+# 数据集路径：CSV，或以 .store 结尾的二进制数据集目录（python dataset_store.py import results.csv results.store）
 DATA_DIR = 'results.csv'
 
 FULL_SCREENSHOT_PATH = 'captures/screenshot.png'
@@ -56,4 +57,129 @@ MAP_PATTERN_DIR='patterns/maps'
 
 DIGIT_PATTERN_DIR = 'patterns/digits'
 
-CARD_OUTPUT_DIR = 'captures/slots'
\ No newline at end of file
+CARD_OUTPUT_DIR = 'captures/slots'
+
+# 数字识别：连通域切分的快速路径里每个字形的最低匹配度，低于它时退回逐模板匹配
+DIGIT_MIN_SCORE = 0.85
+
+# 识别结果缓存：卡槽截图和模式区域按感知哈希缓存识别结果，命中时只与缓存的那个模板复核一次；
+# 最多 RECOGNITION_CACHE_SIZE 条（LRU），匹配度不低于 RECOGNITION_CACHE_MIN_SCORE 才缓存/采用，
+# 保存在 RECOGNITION_CACHE_DIR，模板目录变化后自动作废
+RECOGNITION_CACHE = True
+RECOGNITION_CACHE_DIR = 'cache/'
+RECOGNITION_CACHE_SIZE = 512
+RECOGNITION_CACHE_MIN_SCORE = 0.9
+
+# 设备后端：'adb' 连接模拟器，'replay' 用已保存的截图离线回放（见 replay.py，不连接 adb、不等待）
+DEVICE_BACKEND = 'adb'
+
+# 启动时 adb connect 的超时时间（秒），连不上时退出，由 auto.py 重新启动
+ADB_CONNECT_TIMEOUT = 5
+
+# 启动计时写入 STARTUP_PROFILE_PATH；模型、数据集索引等在第一次操作之后才在后台加载，
+# 最多推迟 STARTUP_DEFER_LIMIT 秒（第一次操作迟迟不来时也开始加载）
+STARTUP_PROFILE_PATH = 'startup_profile.json'
+STARTUP_DEFER_LIMIT = 5
+
+# 要驱动的设备（adb serial）；多于一个时每台设备一个工作线程，共用模型、数据集写入器和后台重训练
+DEVICE_SERIALS = ('127.0.0.1:16384',)
+
+# 截图方式：'png' 走 screencap -p（设备端编码 + PIL 解码），'raw' 直接拉取 RGBA 帧缓冲
+SCREENSHOT_MODE = 'raw'
+
+# take_screenshot 的返回类型：'pil' 返回 PIL.Image（raw 模式下为共享内存的视图），'array' 返回 numpy 数组 (H, W, 4)；
+# 主循环和 card_capture 都通过 RegionExtractor 切片，用 'array' 时截图到识别全程不转换、不复制
+SCREENSHOT_RETURN = 'array'
+
+# 点击输入方式：'shell' 复用常驻的 adb shell 进程，'spawn' 每次点击新起一个 adb 进程
+INPUT_MODE = 'shell'
+
+# 常驻 adb shell 中单条命令的超时时间（秒），超时视为连接断开并自动重连
+SHELL_TIMEOUT = 5
+
+# 模板库两次检查模板目录是否有变动的最短间隔（秒）
+TEMPLATE_CHECK_INTERVAL = 2
+
+# 模式识别：匹配度超过该值即提前结束，不再检查剩余模板
+MODE_EARLY_EXIT = 0.95
+
+# 模式识别：判定为某模式的最低匹配度
+MODE_THRESHOLD = 0.8
+
+# 轮询时画面变化检测：模式区域缩小后平均像素差低于该值视为画面未变，沿用上次识别结果
+FRAME_GATE = True
+FRAME_DIFF_THRESHOLD = 2.0
+
+# 截图流水线：后台线程持续截图，识别与点击使用最新一帧
+PIPELINE_ENABLED = True
+
+# 流水线两次截图之间的最短间隔（秒），避免空转占满 adb
+PIPELINE_INTERVAL = 0.05
+
+# 等待新帧的超时时间（秒）
+PIPELINE_TIMEOUT = 10
+
+# 后台重训练：每多少次预测触发一次
+RETRAIN_EVERY = 100
+
+# 后台重训练：用于新旧模型比较的最新数据行数下限
+RETRAIN_MIN_HOLDOUT = 100
+
+# 模型训练：候选模型是否并行训练，以及总共可用的 CPU 线程数（None 表示全部核心）
+TRAIN_PARALLEL = True
+TRAIN_CPU_BUDGET = None
+
+# 模型仓库目录：训练好的模型按版本保存在这里，启动时直接加载
+MODEL_DIR = 'models/'
+
+# 增量训练：两次全量训练之间最多做多少次增量更新
+INCREMENTAL_TRAINING = True
+FULL_RETRAIN_EVERY = 10
+
+# 增量训练：新数据中留作 holdout 的比例
+INCREMENTAL_HOLDOUT = 0.3
+
+# 增量训练：新数据中用来挑选最佳候选的比例（与 holdout 分开，避免在同一批行上既挑选又比较）
+INCREMENTAL_SELECT = 0.2
+
+# 增量训练：XGB 每次继续提升的轮数，MLP/SGD 每次 partial_fit 的轮数
+INCREMENTAL_XGB_ROUNDS = 20
+INCREMENTAL_EPOCHS = 5
+
+# 训练数据使用稀疏（CSR）特征矩阵，XGB 和线性模型直接在稀疏输入上训练
+SPARSE_FEATURES = True
+
+# 预测时使用编译成 NumPy 的模型（启动和换模型时在数据集最后 INFERENCE_CHECK_ROWS 局上与原模型比对）
+FAST_INFERENCE = True
+INFERENCE_CHECK_ROWS = 1000
+INFERENCE_TOLERANCE = 1e-5
+
+# 写入数据集前检查新行是否与已有行重复或完全相反（取反后相同），True 时跳过这样的行，False 只记录
+DEDUPE_ON_WRITE = True
+
+# 每局的调试截图（全屏 + 槽位 + 数字，写入 CARD_OUTPUT_DIR）：
+# 'off' 不写，'async' 每局由后台线程写，'sampled' 每 DEBUG_SAMPLE_EVERY 局写一次；
+# 后台队列最多积压 DEBUG_QUEUE_SIZE 局，写不过来时丢弃新的一局而不是阻塞识别
+DEBUG_IMAGES = 'async'
+DEBUG_SAMPLE_EVERY = 10
+DEBUG_QUEUE_SIZE = 4
+
+# 最近 RING_SIZE 局的截图和识别结果保存在内存中；识别异常（OCR 低分、卡牌无匹配、999）时
+# 在后台把该局及之前共 RING_DUMP_CONTEXT 局导出到 BACKUP_PATH 下的子目录
+RING_SIZE = 8
+RING_DUMP_CONTEXT = 2
+RING_DUMP_QUEUE_SIZE = 4
+
+# 基准测试（python benchmark.py）：结果写入 BENCHMARK_OUTPUT，与 BENCHMARK_BASELINE 比较，
+# 任一阶段的 p50/p95 延迟或内存分配超过基线 (1 + BENCHMARK_THRESHOLD) 倍时以非 0 状态退出
+BENCHMARK_OUTPUT = 'benchmark_results.json'
+BENCHMARK_BASELINE = 'benchmark_baseline.json'
+BENCHMARK_THRESHOLD = 0.25
+
+# 运行指标（各阶段耗时直方图、计数器）：METRICS=False 时所有计时和计数都是空操作；
+# 开启时后台每 METRICS_INTERVAL 秒把快照写入 METRICS_PATH，
+# METRICS_FORMAT 为 'prometheus'（文本格式，可用 node_exporter 的 textfile 收集）或 'json'
+METRICS = True
+METRICS_FORMAT = 'prometheus'
+METRICS_PATH = 'metrics.prom'
+METRICS_INTERVAL = 15
@@ -0,0 +1,138 @@
+import os
+import json
+import queue
+import threading
+import logging
+import numpy as np
+from PIL import Image
+from config import DEBUG_IMAGES, DEBUG_SAMPLE_EVERY, DEBUG_QUEUE_SIZE
+
+logger = logging.getLogger("my_logger")
+
+MODES = ('off', 'async', 'sampled')
+
+
+def save_item(path, item):
+    """
+    Write a PIL image, an image array (converted here, on the writer thread),
+    or JSON-serialisable metadata (dict / list).
+    """
+    if isinstance(item, (dict, list)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(item, f, ensure_ascii=False, indent=2, default=str)
+    elif isinstance(item, np.ndarray):
+        Image.fromarray(np.ascontiguousarray(item)).save(path)
+    else:
+        item.save(path)
+
+
+class DebugWriter:
+    """
+    Persist per-round debug images off the recognition path.
+
+    Modes:
+      off     -- nothing is written
+      async   -- every round is queued for a background writer thread
+      sampled -- like async, but only every `sample_every`-th round is queued
+
+    The queue holds at most `queue_size` rounds; when the writer falls behind,
+    new rounds are dropped (and counted) instead of blocking the caller.
+    """
+
+    def __init__(self, mode=DEBUG_IMAGES, sample_every=DEBUG_SAMPLE_EVERY, queue_size=DEBUG_QUEUE_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"unknown debug image mode: {mode}")
+        self.mode = mode
+        self.sample_every = max(int(sample_every), 1)
+        self.rounds = 0
+        self.queued = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='debug-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                output_dir, images = item
+                os.makedirs(output_dir, exist_ok=True)
+                for filename, img in images.items():
+                    try:
+                        save_item(os.path.join(output_dir, filename), img)
+                        self.written += 1
+                    except Exception as e:
+                        self.errors += 1
+                        logger.error(f"Failed to write debug image {filename}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, output_dir, images):
+        """
+        Queue one round of images ({filename: PIL image, array or metadata}) for writing; never blocks.
+        Returns True if the round was queued.
+        """
+        self.rounds += 1
+        if self.mode == 'off':
+            return False
+        if self.mode == 'sampled' and (self.rounds - 1) % self.sample_every:
+            self.skipped += 1
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait((output_dir, dict(images)))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        return True
+
+    def flush(self):
+        """
+        Block until every queued round has been written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread is not None:
+            self.flush()
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {'mode': self.mode, 'rounds': self.rounds, 'queued': self.queued, 'skipped': self.skipped,
+                'dropped': self.dropped, 'written': self.written, 'errors': self.errors}
+
+
+_writer = None
+
+
+def get_debug_writer():
+    """
+    Process-wide DebugWriter configured from config.py.
+    """
+    global _writer
+    if _writer is None:
+        _writer = DebugWriter()
+    return _writer
+
+
+def set_debug_writer(writer):
+    """
+    Replace the process-wide DebugWriter (e.g. with DebugWriter('off') for benchmarks).
+    Returns the previous one.
+    """
+    global _writer
+    previous, _writer = _writer, writer
+    return previous
@@ -0,0 +1,82 @@
+import time
+from config import DEVICE_BACKEND, DEVICE_SERIALS, ADB_CONNECT_TIMEOUT
+
+
+class AdbDevice:
+    """
+    One live emulator, driven through adb_controller with its serial.
+
+    adb_controller is imported on construction, so code that only needs a
+    replay device never touches adb.
+    """
+    # Frames come from a real screen: the capture pipeline and real sleeps apply
+    realtime = True
+
+    def __init__(self, serial=None):
+        import adb_controller
+        self._adb = adb_controller
+        self.serial = serial or adb_controller.DEVICE_SERIAL
+        self.name = self.serial
+
+    def connect(self, timeout=ADB_CONNECT_TIMEOUT):
+        """
+        Run `adb connect` for this serial; False if it fails or times out.
+        """
+        return self._adb.connect_device(self.serial, timeout)
+
+    def screenshot(self):
+        return self._adb.take_screenshot(serial=self.serial)
+
+    def tap(self, x, y):
+        self._adb.tap(x, y, serial=self.serial)
+
+    def double_tap(self, x, y, interval=0.2):
+        self._adb.double_tap(x, y, interval, serial=self.serial)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def stats(self):
+        return self._adb.input_latency_stats(self.serial)
+
+
+def create_device(backend=DEVICE_BACKEND, serial=None):
+    """
+    Build a device for `backend`: 'adb' for the emulator with `serial`, 'replay' for
+    ReplayDevice with its default script (named after `serial` if given).
+    """
+    if backend == 'adb':
+        return AdbDevice(serial)
+    if backend == 'replay':
+        from replay import ReplayDevice
+        return ReplayDevice(name=serial or ReplayDevice.name)
+    raise ValueError(f"unknown device backend: {backend}")
+
+
+def create_devices(backend=DEVICE_BACKEND, serials=DEVICE_SERIALS):
+    """
+    One device per configured serial.
+    """
+    return [create_device(backend, serial) for serial in serials]
+
+
+_device = None
+
+
+def get_device():
+    """
+    Process-wide device configured by config.DEVICE_BACKEND.
+    """
+    global _device
+    if _device is None:
+        _device = create_device()
+    return _device
+
+
+def set_device(device):
+    """
+    Replace the process-wide device. Returns the previous one.
+    """
+    global _device
+    previous, _device = _device, device
+    return previous
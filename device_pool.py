@@ -0,0 +1,213 @@
+import os
+import re
+import logging
+import threading
+from config import DATA_DIR, RETRAIN_EVERY, BACKUP_PATH, CARD_OUTPUT_DIR
+from frame_ring import FrameRing, bind_ring
+from metrics import get_metrics, bind_metrics, labeled
+from startup import Deferred
+
+logger = logging.getLogger("my_logger")
+
+
+def device_dirname(name):
+    """
+    A file-system safe directory name for a device (serials contain ':' and '.').
+    """
+    return re.sub(r'[^0-9A-Za-z_-]+', '_', str(name)).strip('_') or 'device'
+
+
+class SharedModel:
+    """
+    The inference model, its compiled predictor, the feature encoder and the
+    background retrainer, shared by every device worker.
+
+    Loading happens off the calling thread: the model (and sklearn, xgboost,
+    pandas behind it) is only needed at the first prediction, so the game loop
+    starts on menus while it loads. `defer(name, fn)` schedules the load and
+    returns a Deferred (default: start it right away); predict_records() waits
+    for it.
+
+    Workers call predict_records() concurrently (the predictor is read-only),
+    poll() between rounds to swap in a retrained model, and count_prediction()
+    after each round; every `retrain_every` predictions across all devices one
+    retrain is submitted. Model swaps and retrain submissions are serialised by a lock.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, header=None, retrain=True, retrain_every=RETRAIN_EVERY, defer=None):
+        self.header = header
+        self.retrain = retrain
+        self.retrain_every = retrain_every
+        self.predictions = 0
+        self.swaps = 0
+        self.model = None
+        self.predictor = None
+        self.encoder = None
+        self.retrainer = None
+        self.X_check = None
+        self._lock = threading.Lock()
+        if defer is None:
+            self._loaded = Deferred('model', lambda: self._load(data_dir)).start()
+        else:
+            self._loaded = defer('model', lambda: self._load(data_dir))
+
+    def _load(self, data_dir):
+        from model_registry import load_or_train
+        from retrainer import BackgroundRetrainer
+        from inference import build_predictor, check_rows
+        from features import FeatureEncoder
+        # 优先加载已保存的模型，数据有变化时在后台重新训练
+        model, meta, stale = load_or_train(data_dir)
+        retrainer = BackgroundRetrainer(data_dir, model, meta=meta)
+        if stale and self.retrain:
+            retrainer.submit()
+        # 预测用编译成 NumPy 的模型，换模型时重新编译并校验
+        X_check = check_rows(data_dir)
+        with self._lock:
+            self.model, self.retrainer, self.X_check = model, retrainer, X_check
+            self.predictor = build_predictor(model, X_check)
+            self.encoder = FeatureEncoder(self.header)
+        return True
+
+    def ready(self):
+        return self._loaded.done()
+
+    def wait(self):
+        """
+        Block until the model is loaded (re-raises a failed load).
+        """
+        if not self._loaded.done():
+            logger.info("Waiting for the model to finish loading")
+        self._loaded.get()
+
+    def predict_records(self, records):
+        """
+        Predict one round from its (name, count) records; returns (label, probability).
+        """
+        self.wait()
+        return self.predictor.predict_one(self.encoder.encode_dense(records))
+
+    def poll(self):
+        """
+        Swap in a finished retrain, if any. Returns True when the model changed.
+        Re-raises the load error if loading the model failed.
+        """
+        if not self.ready():
+            return False
+        # 加载失败时这里抛出原来的异常，而不是 retrainer 为 None 的 AttributeError
+        self.wait()
+        from inference import build_predictor
+        with self._lock:
+            new_model = self.retrainer.poll()
+            if new_model is None:
+                return False
+            self.model = new_model
+            self.predictor = build_predictor(new_model, self.X_check)
+            self.swaps += 1
+            return True
+
+    def count_prediction(self):
+        """
+        Count one finished round; submits a background retrain every `retrain_every` rounds.
+        """
+        self.wait()
+        with self._lock:
+            self.predictions += 1
+            if self.retrain and self.predictions % self.retrain_every == 0 and self.predictions > 1:
+                # 后台进程重训练，新模型在下一局开始前换入
+                self.retrainer.submit()
+
+    def stats(self):
+        return {'ready': self.ready(), 'predictions': self.predictions, 'swaps': self.swaps,
+                'retraining': self.retrainer is not None and self.retrainer.running()}
+
+
+class DeviceLogger(logging.LoggerAdapter):
+    """
+    Prefixes every message with the device name, so interleaved worker logs stay readable.
+    """
+
+    def process(self, msg, kwargs):
+        return f"[{self.extra['device']}] {msg}", kwargs
+
+
+def device_ring(device):
+    """
+    Default per-device FrameRing: anomaly dumps go to BACKUP_PATH/<device>/.
+    """
+    return FrameRing(dump_dir=os.path.join(BACKUP_PATH, device_dirname(device.name)))
+
+
+class DevicePool:
+    """
+    Run one state-machine worker thread per device.
+
+    `target(device, context)` is the worker body; `context` carries the device's
+    logger, debug image directory and the pool's stop event. Each worker thread
+    binds its own FrameRing (a ring tracks one open round) and a metrics view
+    labelled with the device name, so everything recorded on that thread -- adb
+    latencies, recognition stages, round counters -- is per device. Exceptions
+    listed in `finished` end a worker normally (e.g. ReplayFinished); any other
+    exception is logged and ends only that worker.
+    """
+
+    def __init__(self, devices, target, ring_factory=device_ring, finished=()):
+        names = [device.name for device in devices]
+        if len(set(names)) != len(names):
+            raise ValueError(f"device names must be unique: {names}")
+        self.devices = list(devices)
+        self.target = target
+        self.ring_factory = ring_factory
+        self.finished = tuple(finished)
+        self.stop = threading.Event()
+        self.results = {}
+        self._threads = []
+
+    def _work(self, device):
+        bind_ring(self.ring_factory(device))
+        bind_metrics(labeled(get_metrics(), device=device.name))
+        context = {
+            'logger': DeviceLogger(logger, {'device': device.name}),
+            'output_dir': os.path.join(CARD_OUTPUT_DIR, device_dirname(device.name)),
+            'stop': self.stop,
+        }
+        try:
+            self.results[device.name] = self.target(device, context)
+        except self.finished as e:
+            self.results[device.name] = e
+        except Exception as e:
+            self.results[device.name] = e
+            logger.exception(f"Worker for {device.name} failed: {e}")
+        finally:
+            bind_ring(None)
+            bind_metrics(None)
+
+    def start(self):
+        for device in self.devices:
+            thread = threading.Thread(target=self._work, args=(device,),
+                                      name=f'device-{device_dirname(device.name)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def alive(self):
+        return [thread for thread in self._threads if thread.is_alive()]
+
+    def run(self):
+        """
+        Start every worker and wait for all of them; Ctrl+C asks the workers to stop.
+        Returns {device name: worker return value or exception}.
+        """
+        self.start()
+        try:
+            while self.alive():
+                self.join(timeout=0.5)
+        except KeyboardInterrupt:
+            logger.warning("Stopping device workers")
+            self.stop.set()
+            self.join()
+        return self.results
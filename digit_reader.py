@@ -0,0 +1,204 @@
+import time
+import cv2
+import numpy as np
+from PIL import Image
+from config import DIGIT_PATTERN_DIR, DIGIT_MIN_SCORE
+from recognizer import (DIGIT_FN_RE, DIGIT_THRESHOLD, OCR_LOW_SCORE, binarize_digit_template,
+                        number_from_digits, ocr_number, logger)
+from frame_ring import get_ring
+from template_bank import get_bank
+
+# 字形归一化后的画布尺寸 (高, 宽)，比最大的数字字形（21x16）略大
+GLYPH_SHAPE = (24, 20)
+
+# 模板在画布里额外做 ±1 像素的平移，抵消字形包围盒取整带来的错位
+SHIFTS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+# 高度不到模板字形高度这个比例的连通域（数字前的 ×、边缘噪点）不算数字
+MIN_GLYPH_HEIGHT = 0.75
+
+
+def _place(glyph: np.ndarray, dy=0, dx=0) -> np.ndarray:
+    """
+    把二值字形（已裁到包围盒）居中放到 GLYPH_SHAPE 画布上，可额外平移 (dy, dx)；超出画布的部分裁掉。
+    """
+    h, w = GLYPH_SHAPE
+    canvas = np.zeros(GLYPH_SHAPE, dtype=np.float32)
+    gh, gw = min(glyph.shape[0], h), min(glyph.shape[1], w)
+    top = (h - gh) // 2 + dy
+    left = (w - gw) // 2 + dx
+    ys = slice(max(top, 0), min(top + gh, h))
+    xs = slice(max(left, 0), min(left + gw, w))
+    canvas[ys, xs] = glyph[ys.start - top:ys.stop - top, xs.start - left:xs.stop - left] > 0
+    return canvas
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    """
+    每行去均值后归一化为单位向量，点积即相关系数；全 0 / 全 1 的行保持为 0。
+    """
+    mat = mat - mat.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _bbox(img: np.ndarray):
+    ys, xs = np.nonzero(img)
+    return ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+
+
+def _build_features(items):
+    """
+    把数字模板裁到字形包围盒，按 SHIFTS 的每种平移放到画布上，堆成 (模板数 * 平移数, 画布像素) 的归一化矩阵。
+    返回 (digits, 特征矩阵, 模板字形最小高度, 最大宽度)，没有模板时返回 None。
+    """
+    glyphs = []
+    digits = []
+    for name, tpl in items:
+        if not tpl.any():
+            continue
+        y0, y1, x0, x1 = _bbox(tpl)
+        glyphs.append(tpl[y0:y1, x0:x1])
+        digits.append(name[0])
+    if not glyphs:
+        return None
+    rows = [_place(glyph, dy, dx).ravel() for glyph in glyphs for dy, dx in SHIFTS]
+    features = np.ascontiguousarray(_normalize(np.stack(rows)))
+    min_height = min(g.shape[0] for g in glyphs)
+    max_width = max(g.shape[1] for g in glyphs)
+    return digits, features, min_height, max_width
+
+
+class DigitReader:
+    """
+    数字识别：按连通域切出字形，所有字形一次矩阵乘法与全部数字模板比较。
+
+    切分：二值化后取 8 连通域，x 范围重叠的合并为一个字形（断开的笔画），
+    高度不足模板字形 MIN_GLYPH_HEIGHT 的丢弃（右侧数字前的 ×、边缘噪点）。
+    每个字形裁到包围盒后居中放到固定画布上，与模板（同样处理并做 ±1 像素平移）算相关系数，
+    scores = glyphs @ features.T，一次得到每个字形对每个模板的匹配度。
+
+    字形数为 0 或超过 n、字形比所有模板都宽、或任一字形最高匹配度低于 min_score 时，
+    退回 recognizer.ocr_number 的逐模板 matchTemplate。
+    """
+
+    def __init__(self, pattern_dir=DIGIT_PATTERN_DIR, min_score=DIGIT_MIN_SCORE):
+        self.pattern_dir = pattern_dir
+        self.min_score = min_score
+        self.bank = get_bank(pattern_dir, cv2.IMREAD_GRAYSCALE, binarize_digit_template, DIGIT_FN_RE)
+        self.fast = 0
+        self.fallbacks = 0
+
+    def _features(self):
+        return self.bank.derived('digit_features', _build_features)
+
+    def glyphs(self, bw: np.ndarray, min_height: int):
+        """
+        返回按 x 排序的字形 [(x0, 裁好的二值字形), ...]。
+        """
+        count, _, stats, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+        boxes = sorted((x, x + w, y, y + h) for x, y, w, h, _ in stats[1:count])
+        merged = []
+        for x0, x1, y0, y1 in boxes:
+            if merged and x0 < merged[-1][1]:
+                mx0, mx1, my0, my1 = merged[-1]
+                merged[-1] = (mx0, max(mx1, x1), min(my0, y0), max(my1, y1))
+            else:
+                merged.append((x0, x1, y0, y1))
+        return [(x0, bw[y0:y1, x0:x1]) for x0, x1, y0, y1 in merged
+                if y1 - y0 >= min_height * MIN_GLYPH_HEIGHT]
+
+    def read_digits(self, img, n=2):
+        """
+        快速路径：返回 (数字串, 每个字形的匹配度)；需要回退时返回 None。
+        数字区域几乎没有白色像素时返回 ('', [])（ocr_number 对这种情况返回 0）。
+        """
+        features = self._features()
+        if features is None:
+            return None
+        digits, matrix, min_height, max_width = features
+        img = np.asarray(img)
+        gray = cv2.cvtColor(np.ascontiguousarray(img[:, :, :3]), cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
+        bw = (gray > DIGIT_THRESHOLD).astype(np.uint8)
+        if bw.size and cv2.countNonZero(bw) / bw.size < 0.02:
+            return '', []
+        glyphs = self.glyphs(bw, min_height)
+        if not glyphs or len(glyphs) > n or any(g.shape[1] > max_width + 2 for _, g in glyphs):
+            return None
+        batch = _normalize(np.stack([_place(g).ravel() for _, g in glyphs]))
+        scores = (batch @ matrix.T).reshape(len(glyphs), len(digits), len(SHIFTS)).max(axis=2)
+        best = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(glyphs)), best]
+        if confidence.min() < self.min_score:
+            return None
+        return ''.join(digits[i] for i in best), confidence.tolist()
+
+    def read(self, img, n=2):
+        """
+        识别数字区域，返回值与 ocr_number 相同（'0'/'00' 为 999，无法识别为 None）。
+        """
+        result = self.read_digits(img, n)
+        if result is None:
+            self.fallbacks += 1
+            return ocr_number(img, self.pattern_dir, n=n)
+        self.fast += 1
+        digits, confidence = result
+        if not digits:
+            return 0
+        # 与 ocr_number 同一规则：最高匹配度过低才报警，两条路径对同一帧的异常判定一致
+        highest = max(confidence)
+        if highest <= OCR_LOW_SCORE:
+            logger.error(f"[OCR] Warning: Highest match score is low ({highest:.4f})")
+            get_ring().flag('ocr_low_score', score=highest)
+        return number_from_digits(digits)
+
+    def stats(self):
+        return {'fast': self.fast, 'fallbacks': self.fallbacks}
+
+
+_reader = None
+
+
+def get_digit_reader():
+    global _reader
+    if _reader is None:
+        _reader = DigitReader()
+    return _reader
+
+
+def compare_with_template(crops, repeat=50):
+    """
+    对比逐模板 ocr_number 与连通域识别的结果和耗时。返回结果不一致的个数。
+    """
+    reader = get_digit_reader()
+    diffs = 0
+    for crop in crops:
+        loop = ocr_number(crop)
+        fast = reader.read_digits(crop)
+        got = reader.read(crop)
+        flag = 'OK ' if loop == got else 'DIFF'
+        diffs += loop != got
+        detail = 'fallback' if fast is None else f"{fast[0]} {[round(s, 3) for s in fast[1]]}"
+        print(f"{flag} template={loop}  fast={got} ({detail})")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        [ocr_number(crop) for crop in crops]
+    loop_ms = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        [reader.read(crop) for crop in crops]
+    fast_ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"{len(crops)} numbers: template {loop_ms:.2f}ms, fast {fast_ms:.2f}ms, "
+          f"speedup x{loop_ms / fast_ms:.1f}, {reader.stats()}")
+    return diffs
+
+
+if __name__ == '__main__':
+    for folder in ('backup', 'captures/slots'):
+        crops = [np.asarray(Image.open(f"{folder}/{side}_num_{idx}.png").convert('RGB'))
+                 for side in ('left', 'right') for idx in (1, 2, 3)]
+        print(f"== {folder}")
+        compare_with_template(crops)
@@ -0,0 +1,70 @@
+import numpy as np
+import scipy.sparse as sp
+
+# 每次转换的行数，避免大数据集先整体转成 float 稠密矩阵
+CSR_CHUNK_ROWS = 65536
+
+
+def to_csr(values, chunk_rows=CSR_CHUNK_ROWS):
+    """
+    把 (rows, ncols) 的整数数组（可以是 memmap）分块转换为 float32 CSR 矩阵。
+    """
+    values = np.asarray(values)
+    if len(values) <= chunk_rows:
+        return sp.csr_matrix(values, dtype=np.float32)
+    return sp.vstack([sp.csr_matrix(values[i:i + chunk_rows], dtype=np.float32)
+                      for i in range(0, len(values), chunk_rows)], format='csr')
+
+
+def densify(X):
+    """
+    稀疏矩阵转稠密，稠密数组原样返回。
+    """
+    return X.toarray() if sp.issparse(X) else X
+
+
+def memory_report(X, dense_dtype=np.int64):
+    """
+    返回 (稠密存储字节数, 实际字节数)；稠密按 dense_dtype（原来 load_and_process 的类型）计算。
+    """
+    dense = X.shape[0] * X.shape[1] * np.dtype(dense_dtype).itemsize
+    if sp.issparse(X):
+        return dense, X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return dense, X.nbytes
+
+
+class FeatureEncoder:
+    """
+    把一局的 (name, count) 记录编码成 1 x len(header) 的 CSR 行。
+
+    名字到列号的映射只建一次；同名单位的数量会累加，不在 header 里的名字（如 empty1）忽略。
+    """
+
+    def __init__(self, header):
+        self.header = list(header)
+        self.index = {name: i for i, name in enumerate(self.header)}
+
+    def encode(self, records):
+        cols = []
+        vals = []
+        for name, value in records:
+            col = self.index.get(name)
+            if col is not None and value:
+                cols.append(col)
+                vals.append(value)
+        # csr_matrix 会把重复的列号相加
+        row = sp.csr_matrix((np.array(vals, dtype=np.float32), (np.zeros(len(cols), dtype=np.int32), cols)),
+                            shape=(1, len(self.header)))
+        row.sum_duplicates()
+        return row
+
+    def encode_dense(self, records):
+        """
+        同 encode，但直接返回 1 x len(header) 的稠密数组（单行预测时比构造 CSR 更快）。
+        """
+        row = np.zeros((1, len(self.header)))
+        for name, value in records:
+            col = self.index.get(name)
+            if col is not None:
+                row[0, col] += value
+        return row
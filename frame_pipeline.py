@@ -0,0 +1,109 @@
+import threading
+import time
+import logging
+from config import PIPELINE_INTERVAL, PIPELINE_TIMEOUT
+
+logger = logging.getLogger("my_logger")
+
+
+class FramePipeline:
+    """
+    Capture frames on a background thread while recognition and taps run on the caller's thread.
+
+    Only the newest frame is kept (a one-slot buffer, "latest frame wins"): a frame
+    that is replaced before anyone asked for it is counted as dropped. This overlaps
+    the adb round-trip of the next frame with the OpenCV work on the current one.
+
+    A capture that raises is counted as a failure and the thread keeps going; if
+    the thread has died anyway, get() raises instead of waiting out its timeout.
+    """
+
+    def __init__(self, capture, interval=PIPELINE_INTERVAL, timeout=PIPELINE_TIMEOUT):
+        self.capture = capture
+        self.interval = interval
+        self.timeout = timeout
+        self.captured = 0
+        self.dropped = 0
+        self.failures = 0
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._started_at = 0.0   # monotonic time the newest frame's capture began
+        self._consumed_seq = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='frame-pipeline', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+            self._thread = None
+
+    def _run(self):
+        errors = 0   # consecutive captures that raised; only the first of a streak is logged
+        while not self._stop.is_set():
+            started_at = time.monotonic()
+            try:
+                frame = self.capture()
+                errors = 0
+            except Exception as e:
+                frame = None
+                errors += 1
+                if errors == 1:
+                    logger.error(f"Frame capture failed: {e!r}")
+            if frame is None:
+                self.failures += 1
+            else:
+                with self._cond:
+                    if self._frame is not None and self._consumed_seq < self._seq:
+                        self.dropped += 1
+                    self._frame = frame
+                    self._seq += 1
+                    self._started_at = started_at
+                    self.captured += 1
+                    self._cond.notify_all()
+            remaining = self.interval - (time.monotonic() - started_at)
+            if remaining > 0:
+                self._stop.wait(remaining)
+
+    def get(self, fresh=False, timeout=None):
+        """
+        Return the newest frame not returned before.
+
+        With `fresh=True` the frame's capture must also have started after this
+        call, e.g. to observe the screen after a tap. Returns None on timeout or
+        after stop(); raises RuntimeError if the capture thread has died.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        since = time.monotonic()
+        deadline = since + timeout
+
+        def ready():
+            if self._seq <= self._consumed_seq:
+                return False
+            return not fresh or self._started_at >= since
+
+        with self._cond:
+            while not ready():
+                thread = self._thread
+                if thread is None or self._stop.is_set():
+                    return None
+                if not thread.is_alive():
+                    raise RuntimeError("frame pipeline capture thread is not running")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # wake up periodically to notice a dead capture thread
+                self._cond.wait(min(remaining, 1.0))
+            self._consumed_seq = self._seq
+            return self._frame
+
+    def stats(self):
+        return {'captured': self.captured, 'dropped': self.dropped, 'failures': self.failures}
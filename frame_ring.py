@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from config import BACKUP_PATH, RING_SIZE, RING_DUMP_CONTEXT, RING_DUMP_QUEUE_SIZE
+from debug_writer import DebugWriter
+
+logger = logging.getLogger("my_logger")
+
+
+class FrameRing:
+    """
+    Keep the last `size` recognition rounds (screenshot, crops, metadata) in memory.
+
+    A round is opened with `record()`; anything during recognition that looks wrong
+    calls `flag()`, which marks the newest round. `finish()` closes the round and,
+    if it was flagged, queues a dump of it and the `context - 1` rounds before it
+    to BACKUP_PATH/<time>_<seq>_<reason>/ on a background writer. Nothing touches
+    the disk for rounds that go well.
+    """
+
+    def __init__(self, size=RING_SIZE, context=RING_DUMP_CONTEXT, dump_dir=BACKUP_PATH, writer=None):
+        self.context = max(int(context), 1)
+        self.dump_dir = dump_dir
+        self.writer = writer or DebugWriter('async', queue_size=RING_DUMP_QUEUE_SIZE)
+        self.dumps = 0
+        self._entries = deque(maxlen=size)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def record(self, images, **meta):
+        """
+        Open a new round with its images ({filename: PIL image}) and metadata.
+        """
+        with self._lock:
+            self._seq += 1
+            entry = {'seq': self._seq, 'time': time.time(), 'images': dict(images),
+                     'meta': dict(meta), 'anomalies': []}
+            self._entries.append(entry)
+        return entry
+
+    def update(self, **meta):
+        """
+        Add recognition results to the newest round.
+        """
+        with self._lock:
+            if self._entries:
+                self._entries[-1]['meta'].update(meta)
+
+    def flag(self, reason, **details):
+        """
+        Mark the newest round as anomalous. Without an open round this is a no-op.
+        """
+        with self._lock:
+            if self._entries:
+                self._entries[-1]['anomalies'].append(dict(details, reason=reason))
+
+    def finish(self):
+        """
+        Close the newest round; dump it (with context) if it was flagged. Never blocks.
+        Returns the dump directory, or None (also when the writer is off or skips
+        the round by sampling).
+        """
+        with self._lock:
+            if not self._entries or not self._entries[-1]['anomalies']:
+                return None
+            if self.writer.mode == 'off':
+                return None
+            entries = list(self._entries)[-self.context:]
+            current = entries[-1]
+            reason = current['anomalies'][0]['reason']
+            images = {}
+            summary = []
+            for entry in entries:
+                for filename, img in entry['images'].items():
+                    images[f"{entry['seq']:06d}_{filename}"] = img
+                summary.append({'seq': entry['seq'],
+                                'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['time'])),
+                                'meta': dict(entry['meta']), 'anomalies': list(entry['anomalies'])})
+            images['meta.json'] = summary
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(current['time']))
+        path = os.path.join(self.dump_dir, f"{stamp}_{current['seq']:06d}_{reason}")
+        dropped = self.writer.dropped
+        if not self.writer.submit(path, images):
+            # a full queue is the only real loss; 'sampled' skipping rounds is deliberate
+            if self.writer.dropped > dropped:
+                logger.error(f"Anomaly dump dropped ({reason}), writer is behind")
+            return None
+        self.dumps += 1
+        logger.error(f"Anomaly '{reason}' in round {current['seq']}, dumping to {path}")
+        return path
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'rounds': self._seq, 'dumps': self.dumps,
+                'writer': self.writer.stats()}
+
+
+_ring = None
+_local = threading.local()
+
+
+def get_ring():
+    """
+    The FrameRing bound to the calling thread (see bind_ring), otherwise the
+    process-wide one configured from config.py.
+    """
+    ring = getattr(_local, 'ring', None)
+    if ring is not None:
+        return ring
+    global _ring
+    if _ring is None:
+        _ring = FrameRing()
+    return _ring
+
+
+def bind_ring(ring):
+    """
+    Use `ring` for get_ring() calls on the calling thread only (None unbinds).
+    Device workers each bind their own ring, since a ring tracks one open round.
+    """
+    _local.ring = ring
+
+
+def set_ring(ring):
+    """
+    Replace the process-wide FrameRing. Returns the previous one.
+    """
+    global _ring
+    previous, _ring = _ring, ring
+    return previous
@@ -1,5 +1,7 @@
 # image_processor.py
-from config import LEFT_BOTTOM_REGIONS, RIGHT_BOTTOM_REGIONS
+from config import (LEFT_BOTTOM_REGIONS, RIGHT_BOTTOM_REGIONS, LEFT_BOTTOM_NUMS, RIGHT_BOTTOM_NUMS,
+                    MODE_REGION, MAP_REGION)
+from functools import lru_cache
 from PIL import Image, ImageDraw
 import numpy as np
 import cv2
@@ -29,6 +31,10 @@ def preprocess_image_for_model(pil_img, size=(224, 224)):
     return np.expand_dims(img, axis=0)
 
 
+# Circles blanked out of every slot crop on top of the outer mask: (cx, cy, radius)
+SLOT_HOLES = ((90, 105, 22), (22, 105, 22))
+
+
 def mask_circle(img, radius=56, fill=(0, 0, 0)):
     """
     Keep only a central circle of given radius in img, filling outside with `fill` color.
@@ -42,11 +48,122 @@ def mask_circle(img, radius=56, fill=(0, 0, 0)):
     result = Image.composite(img, background, mask)
     draw2 = ImageDraw.Draw(result)
     # draw additional black circles at (80,100) and (10,100) with radius 10
-    draw2.ellipse((90 - 22, 105 - 22, 90 + 22, 105 + 22), fill=fill)
-    draw2.ellipse((22 - 22, 105 - 22, 22 + 22, 105 + 22), fill=fill)
+    for hx, hy, hr in SLOT_HOLES:
+        draw2.ellipse((hx - hr, hy - hr, hx + hr, hy + hr), fill=fill)
     return result
 
 
+@lru_cache(maxsize=None)
+def slot_mask(width, height, radius=56):
+    """
+    (height, width, 3) uint8 mask, 255 where mask_circle keeps the pixel and 0 elsewhere.
+    Drawn once with PIL using the same ellipses, so it matches mask_circle pixel for pixel.
+    """
+    cx, cy = width // 2, height // 2
+    mask = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius), fill=255)
+    for hx, hy, hr in SLOT_HOLES:
+        draw.ellipse((hx - hr, hy - hr, hx + hr, hy + hr), fill=0)
+    arr = np.repeat(np.asarray(mask)[:, :, None], 3, axis=2)
+    arr.flags.writeable = False
+    return arr
+
+
+def as_frame(image):
+    """
+    A screenshot as an (H, W, C) uint8 array (RGB or RGBA). Arrays are returned
+    as they are; a PIL Image is converted once.
+    """
+    return np.asarray(image)
+
+
+class RegionExtractor:
+    """
+    Cut the configured screen regions out of a frame with NumPy slicing.
+
+    Crops are RGB views into the frame (no copy). The only copy is `slots()`,
+    which stacks all slot crops into one (n, h, w, 3) batch and applies the
+    cached circle mask to the whole batch in a single operation.
+    """
+
+    def __init__(self,
+                 slot_regions=LEFT_BOTTOM_REGIONS + RIGHT_BOTTOM_REGIONS,
+                 num_regions=LEFT_BOTTOM_NUMS + RIGHT_BOTTOM_NUMS,
+                 mode_region=MODE_REGION,
+                 map_region=MAP_REGION,
+                 radius=56,
+                 fill=(0, 0, 0)):
+        self.slot_regions = list(slot_regions)
+        self.num_regions = list(num_regions)
+        self.mode_region = mode_region
+        self.map_region = map_region
+        self.radius = radius
+        self.fill = np.array(fill, dtype=np.uint8)
+        sizes = {(w, h) for _, _, w, h in self.slot_regions}
+        self.uniform_slots = len(sizes) == 1
+
+    @staticmethod
+    def crop(frame, region):
+        x, y, w, h = region
+        return frame[y:y + h, x:x + w, :3]
+
+    def crops(self, frame, regions):
+        return [self.crop(frame, region) for region in regions]
+
+    def slots(self, frame):
+        """
+        All masked slot crops: an (n, h, w, 3) uint8 array when the slot regions
+        share one size, otherwise a list of (h, w, 3) arrays.
+        """
+        if not self.uniform_slots:
+            return [self._mask(crop[None])[0] for crop in self.crops(frame, self.slot_regions)]
+        # Stack with every channel and drop alpha afterwards in one pass:
+        # copying strided 3-of-4 channel views element by element is far slower
+        batch = np.stack([frame[y:y + h, x:x + w] for x, y, w, h in self.slot_regions])
+        return self._mask(batch)
+
+    def _mask(self, batch):
+        n, h, w, channels = batch.shape
+        if channels == 4:
+            batch = cv2.cvtColor(batch.reshape(n * h, w, 4), cv2.COLOR_RGBA2RGB).reshape(n, h, w, 3)
+        elif not batch.flags.c_contiguous:
+            batch = np.ascontiguousarray(batch)
+        mask = slot_mask(w, h, self.radius)
+        if self.fill.any():
+            return np.where(mask > 0, batch, self.fill)
+        return np.bitwise_and(batch, mask, out=batch)
+
+    def nums(self, frame):
+        return self.crops(frame, self.num_regions)
+
+    def mode(self, image):
+        """
+        MODE_REGION of a screenshot: a view for arrays, a small PIL crop for PIL
+        images (cheaper than converting the whole screenshot).
+        """
+        return self._region(image, self.mode_region)
+
+    def map(self, image):
+        return self._region(image, self.map_region)
+
+    def _region(self, image, region):
+        if isinstance(image, np.ndarray):
+            return self.crop(image, region)
+        x, y, w, h = region
+        return image.crop((x, y, x + w, y + h))
+
+
+_extractor = None
+
+
+def get_extractor():
+    global _extractor
+    if _extractor is None:
+        _extractor = RegionExtractor()
+    return _extractor
+
+
 def backup_img(pil_img, src_path=None, num=0, slot_name='', mode_name=''):
     """
     将图片备份到 backup 目录下，文件名提供必要信息，包括原文件名/路径、识别值、模式、时间戳等
@@ -0,0 +1,343 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import numpy as np
+import scipy.sparse as sp
+from config import FAST_INFERENCE, INFERENCE_CHECK_ROWS, INFERENCE_TOLERANCE
+
+logger = logging.getLogger("my_logger")
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _as_rows(X):
+    """
+    输入统一成二维 float64 稠密数组（接受 CSR、一维或二维数组）。
+    """
+    if sp.issparse(X):
+        X = X.toarray()
+    X = np.asarray(X, dtype=np.float64)
+    return X[None, :] if X.ndim == 1 else X
+
+
+class Evaluator(ABC):
+    """
+    编译后的二分类模型：predict_proba(X) 返回每行判为 1 的概率，predict_one(x) 一次调用返回 (标签, 概率)。
+    """
+    kind = None
+
+    @abstractmethod
+    def predict_proba(self, X):
+        """
+        每行判为 1 的概率（一维数组）。
+        """
+
+    def predict_one(self, x):
+        p = float(self.predict_proba(x)[0])
+        return int(p > 0.5), p
+
+
+class TreeEnsembleEvaluator(Evaluator):
+    """
+    把所有树拼接成扁平数组，所有树同时按层往下走（叶子节点指向自身），循环次数等于最大深度。
+
+    go_left(x, 阈值) 的比较方式由子类决定（sklearn 为 x <= t，XGBoost 为 x < t 且缺失值走默认方向）；
+    叶子输出 leaf_value 按 combine 汇总：'mean' 为各树概率的平均（RF），'margin' 为 base_margin
+    加各树输出之和再过 sigmoid（XGB）。
+    """
+
+    def __init__(self, trees, combine, base_margin=0.0, missing=None):
+        lefts, rights, features, thresholds, default_left, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for left, right, feature, threshold, dleft, value, tree_depth in trees:
+            n = len(left)
+            is_leaf = left < 0
+            node_ids = np.arange(n) + offset
+            lefts.append(np.where(is_leaf, node_ids, left + offset))
+            rights.append(np.where(is_leaf, node_ids, right + offset))
+            features.append(np.where(is_leaf, 0, feature))
+            thresholds.append(threshold)
+            default_left.append(dleft)
+            values.append(value)
+            roots.append(offset)
+            offset += n
+            depth = max(depth, tree_depth)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.default_left = np.concatenate(default_left).astype(bool)
+        self.value = np.concatenate(values)
+        self.roots = np.array(roots)
+        self.is_leaf = self.left == np.arange(offset)
+        self.depth = depth
+        self.combine = combine
+        self.base_margin = base_margin
+        self.missing = missing
+
+    @abstractmethod
+    def _go_left(self, xv, node):
+        """
+        批量：每个 (行, 树) 在当前节点是否走左子树。
+        """
+
+    def leaves(self, X):
+        X = _as_rows(X)
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        rows = np.arange(len(X))[:, None]
+        for _ in range(self.depth):
+            xv = X[rows, self.feature[node]]
+            node = np.where(self._go_left(xv, node), self.left[node], self.right[node])
+        return node
+
+    def _combine(self, out):
+        if self.combine == 'mean':
+            return out.mean(axis=-1)
+        return _sigmoid(self.base_margin + out.sum(axis=-1))
+
+    def predict_proba(self, X):
+        return self._combine(self.value[self.leaves(X)])
+
+    def _prepare_one(self, x):
+        return x
+
+    @abstractmethod
+    def _go_left_one(self, x, feature, node):
+        """
+        单行：活动树在当前节点是否走左子树（x 为 _prepare_one 的结果）。
+        """
+
+    def predict_one(self, x):
+        # 单行时用一维索引，已到达叶子的树移出活动集合，全部到达后结束（RF 的树深浅不一）
+        x = self._prepare_one(_as_rows(x)[0])
+        node = self.roots
+        total = 0.0
+        while node.size:
+            leaf = self.is_leaf[node]
+            if leaf.any():
+                total += self.value[node[leaf]].sum()
+                node = node[~leaf]
+                if not node.size:
+                    break
+            feature = self.feature[node]
+            node = np.where(self._go_left_one(x, feature, node), self.left[node], self.right[node])
+        if self.combine == 'mean':
+            p = float(total / len(self.roots))
+        else:
+            p = float(_sigmoid(self.base_margin + total))
+        return int(p > 0.5), p
+
+
+class ForestEvaluator(TreeEnsembleEvaluator):
+    kind = 'RF'
+
+    def __init__(self, model):
+        trees = []
+        positive = list(model.classes_).index(1)
+        for est in model.estimators_:
+            t = est.tree_
+            value = t.value[:, 0, :]
+            value = value[:, positive] / value.sum(axis=1)
+            trees.append((t.children_left, t.children_right, t.feature,
+                          np.where(t.children_left < 0, np.inf, t.threshold),
+                          np.zeros(t.node_count), value, t.max_depth))
+        super().__init__(trees, 'mean')
+
+    def _go_left(self, xv, node):
+        # sklearn 先把输入转成 float32 再与 float64 阈值比较
+        return xv.astype(np.float32) <= self.threshold[node]
+
+    def _prepare_one(self, x):
+        return x.astype(np.float32)
+
+    def _go_left_one(self, x, feature, node):
+        return x[feature] <= self.threshold[node]
+
+
+class XGBEvaluator(TreeEnsembleEvaluator):
+    kind = 'XGB'
+
+    def __init__(self, model):
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw('json'))['learner']
+        objective = learner['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"unsupported XGBoost objective: {objective}")
+        base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+        trees = []
+        for tree in learner['gradient_booster']['model']['trees']:
+            left = np.array(tree['left_children'])
+            right = np.array(tree['right_children'])
+            is_leaf = left < 0
+            # 叶子节点的 split_conditions 就是叶子输出
+            conditions = np.array(tree['split_conditions'], dtype=np.float32)
+            trees.append((left, right, np.array(tree['split_indices']),
+                          np.where(is_leaf, np.float32(np.inf), conditions),
+                          np.array(tree['default_left']),
+                          np.where(is_leaf, conditions, 0).astype(np.float64),
+                          self._depth(left, right)))
+        # XGBoost 把稀疏输入里缺省的元素一律当作缺失值；missing 为 NaN 时求值器把它们当成 0，
+        # 只与稠密输入一致（build_predictor 在 CSR 校验数据上会发现并回退）。训练用的 missing=0.0 两者一致
+        missing = model.get_params().get('missing')
+        super().__init__(trees, 'margin', np.log(base_score / (1 - base_score)),
+                         None if missing is None or np.isnan(missing) else float(missing))
+
+    @staticmethod
+    def _depth(left, right):
+        depth = np.zeros(len(left), dtype=int)
+        for i in range(len(left)):
+            if left[i] >= 0:
+                depth[left[i]] = depth[right[i]] = depth[i] + 1
+        return int(depth.max())
+
+    def _go_left(self, xv, node):
+        xv = xv.astype(np.float32)
+        is_missing = np.isnan(xv)
+        if self.missing is not None:
+            is_missing |= xv == self.missing
+        return np.where(is_missing, self.default_left[node], xv < self.threshold[node])
+
+    def _prepare_one(self, x):
+        x = x.astype(np.float32)
+        is_missing = np.isnan(x)
+        if self.missing is not None:
+            is_missing |= x == self.missing
+        return x, is_missing
+
+    def _go_left_one(self, x, feature, node):
+        x, is_missing = x
+        return np.where(is_missing[feature], self.default_left[node], x[feature] < self.threshold[node])
+
+
+class MLPEvaluator(Evaluator):
+    """
+    MaxAbsScaler + MLPClassifier：缩放并入第一层权重，之后是几次矩阵乘法和 ReLU。
+    """
+    kind = 'MLP'
+
+    def __init__(self, model):
+        scaler, mlp = model.steps[0][1], model.steps[-1][1]
+        if mlp.activation != 'relu' or mlp.out_activation_ != 'logistic':
+            raise ValueError(f"unsupported MLP activations: {mlp.activation}/{mlp.out_activation_}")
+        self.weights = [w.copy() for w in mlp.coefs_]
+        self.weights[0] = self.weights[0] / scaler.scale_[:, None]
+        self.biases = [b.copy() for b in mlp.intercepts_]
+        self.positive = list(mlp.classes_).index(1)
+
+    def predict_proba(self, X):
+        h = _as_rows(X)
+        for w, b in zip(self.weights[:-1], self.biases[:-1]):
+            h = np.maximum(h @ w + b, 0)
+        p = _sigmoid(h @ self.weights[-1] + self.biases[-1])[:, 0]
+        return p if self.positive == 1 else 1 - p
+
+
+class LinearEvaluator(Evaluator):
+    """
+    MaxAbsScaler + SGDClassifier(log_loss)：缩放并入系数，一次点积加 sigmoid。
+    """
+    kind = 'SGD'
+
+    def __init__(self, model):
+        scaler, clf = model.steps[0][1], model.steps[-1][1]
+        self.coef = clf.coef_[0] / scaler.scale_
+        self.intercept = clf.intercept_[0]
+        self.positive = list(clf.classes_).index(1)
+
+    def predict_proba(self, X):
+        p = _sigmoid(_as_rows(X) @ self.coef + self.intercept)
+        return p if self.positive == 1 else 1 - p
+
+
+class ModelEvaluator(Evaluator):
+    """
+    不能编译（或编译结果校验失败）时的回退：直接调用原模型，但只调一次 predict_proba。
+    """
+    kind = 'model'
+
+    def __init__(self, model):
+        self.model = model
+        self.positive = list(model.classes_).index(1)
+
+    def predict_proba(self, X):
+        X = X if sp.issparse(X) else _as_rows(X)
+        return self.model.predict_proba(X)[:, self.positive]
+
+
+def compile_model(model):
+    """
+    按模型类型生成对应的 NumPy 求值器，不支持的类型抛 ValueError。
+    """
+    from sklearn.pipeline import Pipeline
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.linear_model import SGDClassifier
+    from xgboost import XGBClassifier
+
+    if isinstance(model, XGBClassifier):
+        return XGBEvaluator(model)
+    if isinstance(model, RandomForestClassifier):
+        return ForestEvaluator(model)
+    if isinstance(model, Pipeline):
+        last = model.steps[-1][1]
+        if isinstance(last, MLPClassifier):
+            return MLPEvaluator(model)
+        if isinstance(last, SGDClassifier) and last.loss == 'log_loss':
+            return LinearEvaluator(model)
+    raise ValueError(f"cannot compile model: {type(model).__name__}")
+
+
+def verify(evaluator, model, X, single_rows=200):
+    """
+    在 X 上比较求值器与原模型，返回 (概率最大误差, 标签不一致的行数)。
+    批量的 predict_proba 检查全部行，单行的 predict_one 检查前 single_rows 行。
+    """
+    positive = list(model.classes_).index(1)
+    expected = model.predict_proba(X)[:, positive]
+    labels = model.predict(X)
+    got = evaluator.predict_proba(X)
+    got_labels = (got > 0.5).astype(labels.dtype)
+    n = min(single_rows, X.shape[0])
+    if n:
+        one = np.array([evaluator.predict_one(X[i:i + 1]) for i in range(n)])
+        got = np.concatenate([got, one[:, 1]])
+        got_labels = np.concatenate([got_labels, one[:, 0].astype(labels.dtype)])
+        expected = np.concatenate([expected, expected[:n]])
+        labels = np.concatenate([labels, labels[:n]])
+    error = float(np.abs(got - expected).max()) if len(expected) else 0.0
+    mismatches = int((got_labels != labels).sum())
+    return error, mismatches
+
+
+def check_rows(data_path, n=INFERENCE_CHECK_ROWS):
+    """
+    取数据集最后 n 局（含镜像）作为校验数据。
+    """
+    from train_models import load_raw, augment
+    return augment(load_raw(data_path).tail(n))[0]
+
+
+def build_predictor(model, X_check=None, enabled=FAST_INFERENCE, tolerance=INFERENCE_TOLERANCE):
+    """
+    返回模型的求值器：能编译且在 X_check 上与原模型一致（概率误差不超过 tolerance，标签完全相同）时
+    使用编译结果，否则回退到 ModelEvaluator。
+    """
+    if not enabled:
+        return ModelEvaluator(model)
+    try:
+        evaluator = compile_model(model)
+    except ValueError as e:
+        logger.warning(f"Fast inference unavailable, using model directly: {e}")
+        return ModelEvaluator(model)
+    if X_check is not None:
+        error, mismatches = verify(evaluator, model, X_check)
+        if error > tolerance or mismatches:
+            logger.error(f"Compiled {evaluator.kind} model disagrees with the original "
+                         f"(max error {error:.2e}, {mismatches} label mismatches), using model directly")
+            return ModelEvaluator(model)
+        logger.info(f"Compiled {evaluator.kind} model verified on {X_check.shape[0]} rows "
+                    f"(max error {error:.2e})")
+    return evaluator
@@ -1,81 +1,163 @@
 # main.py
+# 启动计时从这里开始；sklearn、xgboost、pandas 等重模块只在后台加载模型时才导入
+from startup import get_profile, warm_modes, warm_capture
 import sys
-import os
 import time
-from adb_controller import take_screenshot, tap
-from recognizer import match_pattern
+from device import get_device, create_devices
+from device_pool import DevicePool, SharedModel
+from mode_detector import ModeDetector
+from frame_pipeline import FramePipeline
 import card_capture
-from config import MODE_REGION, WAIT_TIME, MODE_PATTERN_DIR, DATA_DIR
-import csv
-from train_models import train_and_select_best
-import numpy as np
+from debug_writer import get_debug_writer
+from image_processor import get_extractor
+from digit_reader import get_digit_reader
+from recognition_cache import save_caches, cache_stats
+from frame_ring import get_ring
+from metrics import get_metrics, bind_metrics
+from config import WAIT_TIME, DATA_DIR, PIPELINE_ENABLED, DEDUPE_ON_WRITE, DEVICE_SERIALS
+from dataset_store import open_writer
 import random
 import re
 from logger import setup_logger
 
+get_profile().mark('imported')
+
 
 
 #TODO: 局内保持匹配地图，成功后才导出数据
 
+HEADER = [
+    'knight','small_rock','baseball','dog','ice','crocodile','snowball','gatlin','sheep','boxer','sarkaz','neon','mouse','shield','pig','jesselton','bleeding','acid','sax','spider','beast','pompeii','samii','aoe_wizard','hermit_crab','candlestick','boom','big_rock','sailer','reborn','bite','reddao','zizai','zaaro', 'coral', 'small_axe','big_crab','flower','pirate','fast_axe','saw_machine','kicker','mortar','rpg','sarkaz_wizard','big_axe','stabber','door','sandman','water_cannon','archer','swimmer','bear','ice_boom','fast_hammer','small_reddao'
+]
 
-def double_tap(x,y):
-    tap(x,y)
-    time.sleep(0.2)
-    tap(x,y)
 
-def make_feature_vec(header, test_records):
+def make_grabber(device):
     """
-    把test_records转换为特征向量（header对应顺序）。
+    返回截图函数 grab(fresh=False)：开启流水线时从后台截图线程取最新帧，
+    fresh=True 表示必须是调用之后才开始截的帧（用于点击之后观察画面）；未开启时直接截图。
+    回放设备（非实时）不用流水线。等待帧的耗时记入 screenshot 阶段。
+    """
+    metrics = get_metrics()
+    if PIPELINE_ENABLED and device.realtime:
+        def capture():
+            # 截图线程上的 adb 指标也记在本设备名下
+            bind_metrics(metrics)
+            return device.screenshot()
+        get = FramePipeline(capture).start().get
+    else:
+        get = lambda fresh=False: device.screenshot()
+
+    def grab(fresh=False):
+        with metrics.stage('screenshot'):
+            img = get(fresh=fresh)
+        if img is None:
+            metrics.inc('screenshot_failures_total')
+        return img
+    return grab
+
+def main(device=None, data_dir=DATA_DIR, retrain=True, devices=None, **pool_options):
+    """
+    入口。device 默认为 config.DEVICE_BACKEND 对应的设备（模拟器或回放）；
+    配置了多个 DEVICE_SERIALS（或传入 devices）时每台设备一个工作线程（DevicePool），
+    共用一个模型、一个数据集写入器和一个后台重训练进程。
+    data_dir 为读写的数据集，retrain=False 时不做后台重训练（回放压测用）；
+    pool_options 传给 DevicePool（如 finished、ring_factory）。
     """
-    # 建一个名字到分数的字典
-    counts = {name: 0 for name in header}
-    for name, value in test_records:
-        if name in counts:
-            counts[name] += value  # 有的单位同名会多次出现
-        # else: 可以忽略‘empty1’，也可以把所有 empty 系列都映射成0，不影响
-    # 返回特征向量（有序）
-    return [counts[name] for name in header]
-
-def main():
-    
     logger = setup_logger()
-    
+    profile = get_profile()
+    # 模式模板在连接设备的同时加载；模型、数据集索引和卡牌/数字模板在第一次操作之后才在后台加载
+    profile.defer('warm_modes', warm_modes, after_first_action=False)
+    if devices is None:
+        if device is None and len(DEVICE_SERIALS) > 1:
+            devices = create_devices()
+        else:
+            devices = [device or get_device()]
+
+    model = SharedModel(data_dir, HEADER, retrain, defer=profile.defer)
+    # 表头只在打开时检查一次；DATA_DIR 以 .store 结尾时写二进制数据集；
+    # 已有数据建立行索引，重复行和完全相反行按 DEDUPE_ON_WRITE 处理
+    writer = profile.defer('writer', lambda: open_writer(data_dir, HEADER, dedupe=DEDUPE_ON_WRITE))
+    profile.defer('warm_capture', warm_capture)
+
+    if len(devices) == 1:
+        outcome = run_device(devices[0], model, writer, {'logger': logger})
+    else:
+        logger.info(f"Starting {len(devices)} device workers: {[d.name for d in devices]}")
+        results = DevicePool(devices, lambda d, context: run_device(d, model, writer, context),
+                             **pool_options).run()
+        if 'outside' in results.values():
+            outcome = 'outside'
+        elif all(result == 'disconnected' for result in results.values()):
+            outcome = 'disconnected'
+        else:
+            outcome = None
+        logger.debug(f"Workers finished: {results}, model: {model.stats()}")
+    if outcome in ('outside', 'disconnected'):
+        sys.exit(1)
+
+
+def run_device(device, model, writer, context):
+    """
+    单台设备的状态机循环。model 为共享的 SharedModel，writer 为共享的数据集写入器（后台打开的 Deferred）；
+    context 提供 logger、调试截图目录 output_dir 和停止事件 stop（后两者可省略）。
+    连接设备失败返回 'disconnected'，检测到 outside 时返回 'outside'，stop 被设置时返回 None。
+    """
+    logger = context['logger']
+    output_dir = context.get('output_dir')
+    stop = context.get('stop')
+    profile = get_profile()
+
+    with profile.phase(f'connect {device.name}'):
+        connected = device.connect()
+    if not connected:
+        logger.critical(f"Could not connect to {device.name}")
+        return 'disconnected'
+
     correct_predictions = 0   # 预测正确次数
     total_predictions = 0     # 总预测次数
-    # Prepare CSV file for recording slot info and results
-    
-    model, X_test, y_test = train_and_select_best(DATA_DIR)
+
+    mode_detector = ModeDetector()
+    extractor = get_extractor()
+    grab = make_grabber(device)
+    metrics = get_metrics()
+
+    def detect(img):
+        with metrics.stage('mode_detect'):
+            return mode_detector.detect(extractor.mode(img))
+    fresh = True
     
-    header = [
-        'knight','small_rock','baseball','dog','ice','crocodile','snowball','gatlin','sheep','boxer','sarkaz','neon','mouse','shield','pig','jesselton','bleeding','acid','sax','spider','beast','pompeii','samii','aoe_wizard','hermit_crab','candlestick','boom','big_rock','sailer','reborn','bite','reddao','zizai','zaaro', 'coral', 'small_axe','big_crab','flower','pirate','fast_axe','saw_machine','kicker','mortar','rpg','sarkaz_wizard','big_axe','stabber','door','sandman','water_cannon','archer','swimmer','bear','ice_boom','fast_hammer','small_reddao'
-    ]
+    header = HEADER
     
     
     logger.info("Starting automation loop. Press Ctrl+C to stop.")
     
     
-    while True:
+    while stop is None or not stop.is_set():
         
-        img = take_screenshot()
+        img = grab(fresh=fresh)
+        fresh = True
         if img is None:
             logger.error("Failed to capture screenshot")
             continue
         # Determine current mode
-        mode = match_pattern(img.crop(MODE_REGION), MODE_PATTERN_DIR, 0)
+        mode = detect(img)
+        metrics.inc('frames_total', mode=mode)
+        # 第一帧已识别出状态，随后立即执行对应的操作
+        profile.mark('first_action', device=device.name, mode=mode)
         if mode == 'home':
-            double_tap(1750,350)
+            device.double_tap(1750,350)
         elif mode == 'outside':
             logger.critical(f"detected '{mode}' state. Exiting.")  # 此处用 error 显示
-            sys.exit(1)
+            return 'outside'
         elif mode == 'main':
             logger.info("State: main")
             while True:
-                double_tap(1750, 900)
-                time.sleep(WAIT_TIME)
-                img = take_screenshot()
+                device.double_tap(1750, 900)
+                device.sleep(WAIT_TIME)
+                img = grab(fresh=True)
                 if img is None:
                     continue
-                if match_pattern(img.crop(MODE_REGION), MODE_PATTERN_DIR, 0) != 'main':
+                if detect(img) != 'main':
                     break
         elif mode == 'select':
             logger.info("State: select")
@@ -87,17 +169,22 @@ def main():
             # double_tap(1000, 900)
             # time.sleep(1)
             # 单机
-            double_tap(1500, 800)
+            device.double_tap(1500, 800)
             
             
-            time.sleep(0.5)
-            double_tap(1760, 900)
-            time.sleep(0.5)
+            device.sleep(0.5)
+            device.double_tap(1760, 900)
+            device.sleep(0.5)
         elif mode in ('ingame', 'ingame2', 'ingame3', 'ingame4'):
             logger.info("State: ingame")
+            # 两局之间换入后台训练好的新模型
+            model.poll()
             # Capture slot info for both sides
-            time.sleep(0.5)
-            left_slot_info, right_slot_info = card_capture.main()
+            device.sleep(0.5)
+            round_start = time.perf_counter()
+            img = grab(fresh=True)
+            with metrics.stage('capture'):
+                left_slot_info, right_slot_info = card_capture.main(img, output_dir)
             
             # 预测结果
             test_records = []
@@ -105,16 +192,13 @@ def main():
                 test_records.append((name, count or 0))
             for name, count in right_slot_info:
                 test_records.append((name, -(count or 0)))
-            test_feature = make_feature_vec(header, test_records)
-            test_feature_np = np.array(test_feature).reshape(1, -1)
-            y_pred = model.predict(test_feature_np)
-            prob = model.predict_proba(test_feature_np)
-            predicted = y_pred[0]
-            logger.warning(f"Predicted {'WIN' if y_pred[0]==1 else 'LOSE'}, Probability: {prob[0][1]:.2%}")  # 重要输出用WARNING
+            with metrics.stage('predict'):
+                predicted, prob = model.predict_records(test_records)
+            logger.warning(f"Predicted {'WIN' if predicted==1 else 'LOSE'}, Probability: {prob:.2%}")  # 重要输出用WARNING
 
             # # 联机模式
             # time.sleep(random.random() * 5 + 6)
-            # if y_pred[0] == 1:
+            # if predicted == 1:
             #     double_tap(960, 680)
             #     time.sleep(0.5)
             #     double_tap(300, 950)
@@ -123,17 +207,19 @@ def main():
             #     time.sleep(0.5)
             #     double_tap(1580, 950)  
             # # 单机模式
-            double_tap(960, 680)
+            with metrics.stage('tap'):
+                device.double_tap(960, 680)
 
 
             result = None
+            wait_start = time.perf_counter()
             while True:
-                img = take_screenshot()
+                img = grab()
                 if img is None:
                     logger.error("Failed to capture screenshot")
                     continue
                 # 直接用 detect_mode 判断 win/lose
-                state = match_pattern(img.crop(MODE_REGION), MODE_PATTERN_DIR, 0) 
+                state = detect(img)
                 if state == 'win':
                     result = 'win'
                     logger.warning("Detected WIN\n")
@@ -142,21 +228,22 @@ def main():
                     result = 'lose'
                     logger.warning("Detected LOSE\n")
                     break
-                # 还没到胜/败界面则继续轮询
-                time.sleep(0.3)
+                # 还没到胜/败界面则继续轮询（流水线模式下 grab 本身会等待下一帧）
+                if not PIPELINE_ENABLED:
+                    device.sleep(0.3)
             # —— 检测完毕 —— 
+            metrics.observe('stage_seconds', time.perf_counter() - wait_start, stage='result_wait')
+            metrics.observe('round_seconds', time.perf_counter() - round_start)
             # Prepare records with negative counts for the losing side
             
             total_predictions += 1
-            
-            if total_predictions % 100 == 0 and total_predictions > 1:
-                model, X_test, y_test = train_and_select_best(DATA_DIR)
-                logger.error("New model trained and selected")
+            model.count_prediction()
             
             # 实际结果映射成数字：'win'->1, 'lose'->0
             actual = 1 if result == 'win' else 0
             if predicted == actual:
                 correct_predictions += 1
+            metrics.inc('rounds_total', result=result, correct=str(predicted == actual).lower())
                 
             logger.warning(f"Accuracy: {correct_predictions / total_predictions:.2%}, {correct_predictions}/{total_predictions}")  # 重要输出用WARNING
             
@@ -175,6 +262,7 @@ def main():
                     records.append((name, count or 0))
             
             if 999 in (count for name, count in records):
+                metrics.inc('rows_skipped_total', reason='ocr_999')
                 logger.critical("Wrong Number (999), output ancelled")
                 continue
             
@@ -196,45 +284,43 @@ def main():
                 
                 
             if skip_write:
+                metrics.inc('rows_skipped_total', reason='zero_count')
                 continue
 
             else:
-            # 写 CSV
-                write_header = False
-                if not os.path.exists(DATA_DIR) or os.path.getsize(DATA_DIR) == 0:
-                    write_header = True
-                else:
-                    with open(DATA_DIR, 'r', newline='') as f:
-                        reader = csv.reader(f)
-                        try:
-                            first_row = next(reader)
-                            if first_row != header:
-                                write_header = True
-                        except StopIteration:
-                            write_header = True
-
-                with open(DATA_DIR, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    if write_header:
-                        writer.writerow(header)
-                    writer.writerow([record_dict.get(name, 0) for name in header])
+            # 写数据集
+                with metrics.stage('write'):
+                    status, first = writer.get().append([record_dict.get(name, 0) for name in header])
+                metrics.inc('rows_total', status=status)
+                if status != 'new':
+                    logger.info(f"Record is a {status} of row {first}"
+                                f"{', not written' if DEDUPE_ON_WRITE else ''}")
 
         elif mode in ('clearing', 'clearing2'):
             logger.info("State: clearing")
             while True:
-                double_tap(1800, 1000)
-                time.sleep(WAIT_TIME)
-                img = take_screenshot()
+                device.double_tap(1800, 1000)
+                device.sleep(WAIT_TIME)
+                img = grab(fresh=True)
                 if img is None:
                     continue
-                if match_pattern(img.crop(MODE_REGION), MODE_PATTERN_DIR, 0) != 'clearing':
+                if detect(img) != 'clearing':
                     break
             logger.error("Cycle completed")
+            logger.debug(f"Device: {device.stats()}")
+            logger.debug(f"Mode detection: {mode_detector.stats()}")
+            logger.debug(f"Debug images: {get_debug_writer().stats()}")
+            logger.debug(f"Frame ring: {get_ring().stats()}")
+            logger.debug(f"Digit OCR: {get_digit_reader().stats()}")
+            logger.debug(f"Recognition cache: {cache_stats()}")
+            save_caches()
         elif mode in ('loading', 'interm','interm2','prepare','win','lose','nomode'):
+            # 没有点击，下一次直接用流水线里已有的新帧
+            fresh = False
             continue
         else:
             logger.info(f"Unknown mode '{mode}', waiting.")
-            time.sleep(WAIT_TIME)
+            device.sleep(WAIT_TIME)
 
 
 if __name__ == '__main__':
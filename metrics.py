@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+from config import METRICS, METRICS_FORMAT, METRICS_PATH, METRICS_INTERVAL
+
+logger = logging.getLogger("my_logger")
+
+FORMATS = ('prometheus', 'json')
+
+# Prefix of every exported metric name
+PREFIX = 'caa_'
+
+# Histogram bucket upper bounds in seconds (adb round-trips are tens of ms, result waits are seconds)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram of observations in seconds, as in the Prometheus data model.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile by linear interpolation inside its bucket (never above the maximum seen).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class _Timer:
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms, periodically written to a file.
+
+    Metrics are identified by a name plus keyword labels, e.g.
+    ``inc('rounds_total', result='win')`` or ``with timer('stage_seconds', stage='ocr'):``.
+    `stage(name)` is shorthand for the per-stage latency histogram used across
+    the main loop. Every `interval` seconds a background thread writes a snapshot
+    to `path` (write-then-rename, so readers never see a partial file) in
+    Prometheus text format or JSON; a final snapshot is written at exit.
+    """
+    enabled = True
+
+    def __init__(self, path=METRICS_PATH, fmt=METRICS_FORMAT, interval=METRICS_INTERVAL, buckets=BUCKETS):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown metrics format: {fmt}")
+        self.path = path
+        self.format = fmt
+        self.interval = interval
+        self.buckets = tuple(buckets)
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        self._observe(_key(name, labels), seconds)
+
+    def _observe(self, key, seconds):
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self.buckets)
+            hist.observe(seconds)
+
+    def timer(self, name, **labels):
+        """
+        Context manager that observes the time spent inside it into histogram `name`.
+        """
+        return _Timer(self, _key(name, labels))
+
+    def stage(self, stage, **labels):
+        return self.timer('stage_seconds', stage=stage, **labels)
+
+    def start(self):
+        """
+        Start the background snapshot thread (no-op without a path or interval).
+        """
+        if not self.path or not self.interval or (self._thread is not None and self._thread.is_alive()):
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+        self.write()
+
+    def snapshot(self):
+        """
+        Plain-dict copy of every metric: {'counters': [...], 'histograms': [...]}.
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = []
+            for (name, labels), hist in sorted(self._histograms.items()):
+                histograms.append({
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': hist.count,
+                    'sum': round(hist.sum, 6),
+                    'mean_ms': round(hist.sum / hist.count * 1000, 3),
+                    'p50_ms': round(hist.quantile(0.5) * 1000, 3),
+                    'p95_ms': round(hist.quantile(0.95) * 1000, 3),
+                    'max_ms': round(hist.max * 1000, 3),
+                    'buckets': dict(zip([*map(str, hist.bounds), '+Inf'], hist.counts)),
+                })
+        return {'time': time.time(), 'uptime': round(time.time() - self.started, 3),
+                'counters': counters, 'histograms': histograms}
+
+    def render_prometheus(self):
+        """
+        The current metrics in the Prometheus text exposition format.
+        """
+        def fmt_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, hist.bounds, list(hist.counts), hist.count, hist.sum)
+                          for key, hist in sorted(self._histograms.items())]
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {PREFIX}{name} counter')
+            lines.append(f'{PREFIX}{name}{fmt_labels(labels)} {value}')
+        for (name, labels), bounds, counts, count, total in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+            cumulative = 0
+            for bound, n in zip([*map(str, bounds), '+Inf'], counts):
+                cumulative += n
+                lines.append(f'{PREFIX}{name}_bucket{fmt_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{fmt_labels(labels)} {total:.6f}')
+            lines.append(f'{PREFIX}{name}_count{fmt_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path=None):
+        """
+        Write a snapshot to `path` (default self.path) atomically. Errors are logged, not raised.
+        """
+        path = path or self.path
+        if not path:
+            return
+        try:
+            if self.format == 'json':
+                text = json.dumps(self.snapshot(), indent=2)
+            else:
+                text = self.render_prometheus()
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.error(f"Failed to write metrics to {path}: {e}")
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """
+    Drop-in replacement used when metrics are off: every call is a no-op and
+    timers are one shared, stateless context manager.
+    """
+    enabled = False
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return _NULL_TIMER
+
+    def stage(self, stage, **labels):
+        return _NULL_TIMER
+
+    def start(self):
+        return self
+
+    def close(self):
+        pass
+
+    def snapshot(self):
+        return {'counters': [], 'histograms': []}
+
+    def write(self, path=None):
+        pass
+
+
+class LabeledMetrics:
+    """
+    A view of another Metrics that adds fixed labels (e.g. device=...) to every
+    metric recorded through it.
+    """
+
+    def __init__(self, parent, **labels):
+        self.parent = parent
+        self.labels = labels
+        self.enabled = parent.enabled
+
+    def inc(self, name, value=1, **labels):
+        self.parent.inc(name, value, **self.labels, **labels)
+
+    def observe(self, name, seconds, **labels):
+        self.parent.observe(name, seconds, **self.labels, **labels)
+
+    def timer(self, name, **labels):
+        return self.parent.timer(name, **self.labels, **labels)
+
+    def stage(self, stage, **labels):
+        return self.parent.stage(stage, **self.labels, **labels)
+
+
+_metrics = None
+_local = threading.local()
+
+
+def get_metrics():
+    """
+    Metrics bound to the calling thread (see bind_metrics), otherwise the process-wide
+    metrics configured from config.py (a NullMetrics when METRICS is off).
+    """
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is not None:
+        return metrics
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics().start() if METRICS else NullMetrics()
+    return _metrics
+
+
+def labeled(metrics, **labels):
+    """
+    `metrics` with `labels` added to everything recorded through it (unchanged when disabled).
+    """
+    return LabeledMetrics(metrics, **labels) if metrics.enabled else metrics
+
+
+def bind_metrics(metrics):
+    """
+    Make get_metrics() return `metrics` on the calling thread only (None unbinds).
+    Device workers bind a labeled() view so adb and recognition metrics carry the device.
+    """
+    _local.metrics = metrics
+
+
+def set_metrics(metrics):
+    """
+    Replace the process-wide metrics (e.g. with NullMetrics() for benchmarks). Returns the previous one.
+    """
+    global _metrics
+    previous, _metrics = _metrics, metrics
+    return previous
+
+
+def compare_overhead(n=200000):
+    """
+    Per-call cost of a stage timer and a counter, with metrics on and off.
+    """
+    for metrics in (NullMetrics(), Metrics(path=None)):
+        start = time.perf_counter()
+        for _ in range(n):
+            with metrics.stage('noop'):
+                pass
+        timer_ns = (time.perf_counter() - start) / n * 1e9
+        start = time.perf_counter()
+        for _ in range(n):
+            metrics.inc('noop_total')
+        inc_ns = (time.perf_counter() - start) / n * 1e9
+        print(f"{type(metrics).__name__:12s} timer {timer_ns:6.0f}ns  inc {inc_ns:6.0f}ns")
+
+
+if __name__ == '__main__':
+    compare_overhead()
@@ -0,0 +1,177 @@
+import re
+from collections import defaultdict
+import cv2
+from config import MODE_PATTERN_DIR, MODE_EARLY_EXIT, MODE_THRESHOLD, FRAME_GATE, RECOGNITION_CACHE
+from recognizer import to_rgb_array
+from change_detector import ChangeDetector
+from template_bank import get_bank
+from recognition_cache import get_cache
+
+# 状态转移先验：上一个状态之后最可能出现的状态（按可能性排序）
+# 同一状态的多个模板（ingame2、clearing2 ...）归为同一个状态
+TRANSITIONS = {
+    'home': ['main', 'loading'],
+    'main': ['select', 'loading', 'main'],
+    'select': ['loading', 'prepare', 'select'],
+    'loading': ['prepare', 'ingame', 'loading'],
+    'prepare': ['ingame', 'prepare'],
+    'ingame': ['win', 'lose', 'ingame'],
+    'win': ['clearing', 'win'],
+    'lose': ['clearing', 'lose'],
+    'clearing': ['interm', 'main', 'select', 'clearing'],
+    'interm': ['main', 'select', 'home', 'interm'],
+}
+
+# 先验在排序中相当于多少次实际观测到的转移
+PRIOR_WEIGHT = 3
+
+STATE_RE = re.compile(r"^(.*?)\d*$")
+
+
+def state_of(name):
+    """
+    模板名 -> 状态名，如 'ingame3' -> 'ingame'。
+    """
+    return STATE_RE.match(name).group(1)
+
+
+class ModeDetector:
+    """
+    带状态转移先验的模式识别。
+
+    先按上一状态最可能的后继状态依次匹配，匹配度 ≥ early_exit 时只再比较同状态的其余模板即返回；
+    都没有明显命中时才扫描剩余全部模板，结果与 match_pattern(..., important=0) 一致。
+    每次识别都会记录实际发生的状态转移，候选顺序随观测次数自适应调整。
+    启用 gate 时，模式区域与上次识别时相比没有变化就直接沿用上次结果。
+    启用识别缓存时，模式区域的感知哈希命中后只与缓存的那个模板复核一次。
+    """
+
+    def __init__(self, pattern_dir=MODE_PATTERN_DIR, threshold=MODE_THRESHOLD,
+                 early_exit=MODE_EARLY_EXIT, gate=FRAME_GATE, cache=RECOGNITION_CACHE):
+        self.bank = get_bank(pattern_dir)
+        self.cache = get_cache('mods', self.bank) if cache else None
+        self.threshold = threshold
+        self.early_exit = early_exit
+        self.gate = ChangeDetector() if gate else None
+        self.last_state = None
+        self.last_name = None
+        self.transitions = defaultdict(lambda: defaultdict(int))
+        self.polls = 0
+        self.early_exits = 0
+        self.full_scans = 0
+        self.templates_checked = 0
+        self.predicted_hits = defaultdict(int)   # 上一状态 -> 命中候选的次数
+        self.predicted_polls = defaultdict(int)  # 上一状态 -> 识别次数
+
+    def _candidate_states(self):
+        if self.last_state is None:
+            return []
+        weights = defaultdict(float)
+        prior = TRANSITIONS.get(self.last_state, [])
+        for rank, state in enumerate(prior):
+            weights[state] += PRIOR_WEIGHT * (len(prior) - rank) / len(prior)
+        for state, count in self.transitions[self.last_state].items():
+            weights[state] += count
+        return sorted(weights, key=weights.get, reverse=True)
+
+    def _ordered_templates(self):
+        items = self.bank.templates()
+        by_state = defaultdict(list)
+        for name, template in items:
+            by_state[state_of(name)].append((name, template))
+        candidates = []
+        for state in self._candidate_states():
+            candidates.extend(by_state.pop(state, []))
+        rest = [item for state_items in by_state.values() for item in state_items]
+        return candidates, rest
+
+    def _score(self, img, template):
+        self.templates_checked += 1
+        res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
+        return cv2.minMaxLoc(res)[1]
+
+    def _record(self, name, predicted):
+        state = state_of(name) if name != 'nomatch' else 'nomatch'
+        if self.last_state is not None:
+            self.predicted_polls[self.last_state] += 1
+            if predicted:
+                self.predicted_hits[self.last_state] += 1
+            if state != 'nomatch':
+                self.transitions[self.last_state][state] += 1
+        if state != 'nomatch':
+            self.last_state = state
+
+    def detect(self, pil_img):
+        """
+        识别 MODE_REGION 截图对应的模式，返回模板名，低于阈值时返回 'nomatch'。
+        """
+        self.polls += 1
+        img = to_rgb_array(pil_img)
+        if self.gate is not None:
+            if not self.gate.changed('mode', img) and self.last_name is not None:
+                return self.last_name
+        key = None
+        if self.cache is not None:
+            key, cached = self.cache.lookup(img)
+            if cached is not None:
+                template = self.bank.derived('by_name', dict).get(cached)
+                if template is not None and self._score(img, template) >= self.cache.min_score:
+                    self._record(cached, state_of(cached) in self._candidate_states())
+                    self.last_name = cached
+                    return cached
+                self.cache.reject(key)
+        name, val = self._scan(img)
+        if self.cache is not None and name != 'nomatch':
+            self.cache.store(key, name, val)
+        return name
+
+    def _scan(self, img):
+        """
+        按候选顺序匹配模板，返回 (模板名或 'nomatch', 匹配度)。
+        """
+        candidates, rest = self._ordered_templates()
+
+        best_name, best_val = None, 0.0
+        for idx, (name, template) in enumerate(candidates):
+            val = self._score(img, template)
+            if val >= self.early_exit:
+                # 同一状态的其余模板（如 ingame2）一并比较，返回的模板名与全量扫描一致
+                state = state_of(name)
+                for other, other_tpl in candidates[idx + 1:]:
+                    if state_of(other) == state:
+                        other_val = self._score(img, other_tpl)
+                        if other_val > val:
+                            name, val = other, other_val
+                self.early_exits += 1
+                self._record(name, True)
+                self.last_name = name
+                return name, val
+            if val > best_val:
+                best_name, best_val = name, val
+
+        self.full_scans += 1
+        for name, template in rest:
+            val = self._score(img, template)
+            if val > best_val:
+                best_name, best_val = name, val
+
+        name = best_name if best_val >= self.threshold else 'nomatch'
+        predicted = name != 'nomatch' and any(name == n for n, _ in candidates)
+        self._record(name, predicted)
+        self.last_name = name
+        return name, best_val
+
+    def stats(self):
+        hit_rates = {
+            state: self.predicted_hits[state] / polls
+            for state, polls in self.predicted_polls.items() if polls
+        }
+        return {
+            'polls': self.polls,
+            'early_exits': self.early_exits,
+            'full_scans': self.full_scans,
+            'templates_per_poll': self.templates_checked / self.polls if self.polls else 0.0,
+            'skipped': self.gate.skipped['mode'] if self.gate is not None else 0,
+            'hit_rates': hit_rates,
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import logging
+from config import MODEL_DIR
+from dataset_store import SCHEMA_FILE, DATA_FILE, count_rows
+
+logger = logging.getLogger("my_logger")
+
+CURRENT_FILE = 'CURRENT'
+
+# 版本目录名；保存中途留下的 vNNNN.tmp 不算版本
+VERSION_RE = re.compile(r'^v\d+$')
+
+
+def dataset_hash(file_path):
+    """
+    数据集内容的 sha256；.store 目录依次哈希 schema 和数据文件。
+    """
+    if os.path.isdir(file_path):
+        paths = [os.path.join(file_path, SCHEMA_FILE), os.path.join(file_path, DATA_FILE)]
+    else:
+        paths = [file_path]
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def config_hash(train_config):
+    """
+    训练配置（train_models.training_config()）的 sha256。
+    """
+    payload = json.dumps(train_config, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _atomic_write(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """
+    按版本保存在磁盘上的模型仓库。
+
+    每个版本一个目录 models/vNNNN/，包含 model.pkl、meta.json
+    （数据集哈希、训练配置哈希、行数、准确率等），以及可选的 candidates.pkl（全部候选模型，
+    供增量训练继续更新）；models/CURRENT 记录正在使用的版本，回滚只需改写这个指针。
+    """
+
+    def __init__(self, root=MODEL_DIR):
+        self.root = root
+
+    def _dir(self, version):
+        return os.path.join(self.root, version)
+
+    def versions(self):
+        """
+        所有版本的 meta，按版本号从旧到新排列。
+        """
+        if not os.path.isdir(self.root):
+            return []
+        metas = []
+        for name in sorted(os.listdir(self.root)):
+            if not VERSION_RE.match(name):
+                continue
+            meta_path = os.path.join(self.root, name, 'meta.json')
+            if os.path.isfile(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    metas.append(json.load(f))
+        return metas
+
+    def save(self, model, meta, candidates=None, make_current=True):
+        """
+        保存新版本并（默认）设为当前版本，返回带版本号的 meta。
+        """
+        os.makedirs(self.root, exist_ok=True)
+        self._remove_stale_tmp()
+        existing = [m['version'] for m in self.versions()]
+        number = int(existing[-1][1:]) + 1 if existing else 1
+        version = f"v{number:04d}"
+        meta = dict(meta, version=version, created=time.strftime('%Y-%m-%d %H:%M:%S'))
+        path = self._dir(version)
+        tmp_path = f"{path}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        _atomic_write(os.path.join(tmp_path, 'model.pkl'), pickle.dumps(model))
+        if candidates is not None:
+            _atomic_write(os.path.join(tmp_path, 'candidates.pkl'), pickle.dumps(candidates))
+        _atomic_write(os.path.join(tmp_path, 'meta.json'),
+                      json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8'))
+        os.replace(tmp_path, path)
+        if make_current:
+            self.set_current(version)
+        return meta
+
+    def _remove_stale_tmp(self):
+        """
+        删除上次保存中途崩溃留下的 vNNNN.tmp 目录。
+        """
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.tmp') and VERSION_RE.match(name[:-4]) and os.path.isdir(path):
+                logger.warning(f"Removing incomplete model version {path}")
+                shutil.rmtree(path, ignore_errors=True)
+
+    def load(self, version):
+        with open(os.path.join(self._dir(version), 'model.pkl'), 'rb') as f:
+            return pickle.load(f)
+
+    def load_candidates(self, version):
+        """
+        该版本保存的全部候选模型 {name: model}，没有保存时返回 None。
+        """
+        path = os.path.join(self._dir(version), 'candidates.pkl')
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def set_current(self, version):
+        if not os.path.isdir(self._dir(version)):
+            raise ValueError(f"unknown model version: {version}")
+        _atomic_write(os.path.join(self.root, CURRENT_FILE), version.encode('ascii'))
+
+    def current(self):
+        """
+        当前版本的 meta；没有 CURRENT 指针时取最新版本。
+        """
+        metas = self.versions()
+        if not metas:
+            return None
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        if os.path.isfile(pointer):
+            with open(pointer, encoding='ascii') as f:
+                version = f.read().strip()
+            for meta in metas:
+                if meta['version'] == version:
+                    return meta
+        return metas[-1]
+
+    def latest_compatible(self, cfg_hash):
+        """
+        与当前训练配置兼容的版本：优先当前版本，否则最新的兼容版本。
+        """
+        current = self.current()
+        if current is not None and current['config_hash'] == cfg_hash:
+            return current
+        compatible = [m for m in self.versions() if m['config_hash'] == cfg_hash]
+        return compatible[-1] if compatible else None
+
+    def rollback(self, version=None):
+        """
+        回滚到指定版本；不指定时回到当前版本之前的、配置兼容的上一个版本。
+        """
+        if version is None:
+            current = self.current()
+            if current is None:
+                raise ValueError("registry is empty")
+            older = [m for m in self.versions()
+                     if m['version'] < current['version'] and m['config_hash'] == current['config_hash']]
+            if not older:
+                raise ValueError(f"no version before {current['version']}")
+            version = older[-1]['version']
+        self.set_current(version)
+        return version
+
+
+def load_or_train(data_path, registry=None):
+    """
+    启动时获取模型：有配置兼容的已保存模型就直接加载（毫秒级），否则训练并保存。
+
+    返回 (model, meta, stale)；stale 为 True 表示数据集在该模型训练后有变化，需要重新训练。
+    """
+    from train_models import load_and_process, train_candidates, training_config
+
+    registry = registry or ModelRegistry()
+    cfg_hash = config_hash(training_config())
+    data_hash = dataset_hash(data_path)
+
+    meta = registry.latest_compatible(cfg_hash)
+    if meta is not None:
+        start = time.perf_counter()
+        model = registry.load(meta['version'])
+        stale = meta['data_hash'] != data_hash
+        logger.info(f"Loaded model {meta['version']} ({meta['model']}, acc={meta['accuracy']:.4f}) "
+                    f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+                    f"{', dataset changed since training' if stale else ''}")
+        return model, meta, stale
+
+    models, results, _, _ = train_candidates(*load_and_process(data_path))
+    best_name = max(results, key=results.get)
+    model = models[best_name]
+    meta = registry.save(model, {
+        'model': best_name,
+        'accuracy': results[best_name],
+        'data_hash': data_hash,
+        'config_hash': cfg_hash,
+        'rows': count_rows(data_path),
+        'updates_since_full': 0,
+    }, candidates=models)
+    logger.info(f"Trained and saved model {meta['version']}")
+    return model, meta, False
+
+
+if __name__ == '__main__':
+    # python model_registry.py list | rollback [version]
+    registry = ModelRegistry()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        current = registry.current()
+        for m in registry.versions():
+            flag = '*' if current and m['version'] == current['version'] else ' '
+            print(f"{flag} {m['version']}  {m['created']}  {m['model']:<6} "
+                  f"acc={m['accuracy']:.4f} rows={m['rows']} data={m['data_hash'][:8]} cfg={m['config_hash'][:8]}")
+    elif command == 'rollback':
+        print(f"Current model: {registry.rollback(sys.argv[2] if len(sys.argv) > 2 else None)}")
+    else:
+        print(f"Unknown command: {command}")
@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from config import RECOGNITION_CACHE_DIR, RECOGNITION_CACHE_SIZE, RECOGNITION_CACHE_MIN_SCORE
+
+logger = logging.getLogger("my_logger")
+
+# 计算哈希前把图像缩小到的尺寸 (宽, 高)，以及每个通道保留的高位数
+HASH_SIZE = (16, 16)
+HASH_BITS = 5
+
+
+def image_key(img) -> str:
+    """
+    图像的感知哈希：缩到 HASH_SIZE（区域平均）后每个通道只保留高 HASH_BITS 位，再取 64 位摘要。
+    同一图标在不同局的截图只有轻微噪声，缩小、量化后字节完全相同。
+    """
+    arr = np.ascontiguousarray(np.asarray(img))
+    thumb = cv2.resize(arr, HASH_SIZE, interpolation=cv2.INTER_AREA) >> (8 - HASH_BITS)
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(str(arr.shape).encode())
+    digest.update(thumb.tobytes())
+    return digest.hexdigest()
+
+
+def template_fingerprint(items) -> str:
+    """
+    模板集合的指纹（文件名和像素），模板增删或修改后会变化。
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, tpl in items:
+        digest.update(name.encode())
+        digest.update(str(tpl.shape).encode())
+        digest.update(tpl.tobytes())
+    return digest.hexdigest()
+
+
+class RecognitionCache:
+    """
+    识别结果缓存：图像感知哈希 -> (模板名, 匹配度)，LRU 淘汰，保存在 RECOGNITION_CACHE_DIR/<name>.json。
+
+    只缓存匹配度不低于 min_score 的结果。命中后调用方只需用命中的那一个模板重新算一次匹配度，
+    不低于 min_score 才采用（否则调用 reject 删除该条并完整识别）。
+    缓存与模板库的指纹绑定：模板目录有变化时（包括重启后加载的旧文件）整个缓存作废。
+    """
+
+    def __init__(self, name, bank, capacity=RECOGNITION_CACHE_SIZE,
+                 min_score=RECOGNITION_CACHE_MIN_SCORE, cache_dir=RECOGNITION_CACHE_DIR):
+        self.name = name
+        self.bank = bank
+        self.capacity = capacity
+        self.min_score = min_score
+        self.path = os.path.join(cache_dir, f"{name}.json") if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+        self.rejects = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._fingerprint = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._fingerprint = data['fingerprint']
+            for key, label, score in data['entries']:
+                self._entries[key] = (label, score)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring unreadable recognition cache {self.path}: {e}")
+            self._entries.clear()
+            self._fingerprint = None
+
+    def _check_templates(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Templates of {self.bank.pattern_dir} changed, "
+                            f"dropping {len(self._entries)} cached {self.name} results")
+            self._entries.clear()
+            self._fingerprint = fingerprint
+            self._dirty = True
+
+    def lookup(self, img):
+        """
+        返回 (key, 缓存的模板名或 None)。
+        """
+        key = image_key(img)
+        fingerprint = self.bank.derived('fingerprint', template_fingerprint)
+        with self._lock:
+            self._check_templates(fingerprint)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return key, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return key, entry[0]
+
+    def store(self, key, label, score):
+        """
+        记录一次完整识别的结果；匹配度低于 min_score 的不缓存。
+        """
+        if score < self.min_score:
+            return
+        with self._lock:
+            self._entries[key] = (label, round(float(score), 4))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def reject(self, key):
+        """
+        命中的结果复核没有通过：删除该条。
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.rejects += 1
+                self.hits -= 1
+                self.misses += 1
+                self._dirty = True
+
+    def save(self):
+        """
+        有变化时写回磁盘（先写临时文件再替换）。
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'fingerprint': self._fingerprint,
+                    'entries': [[key, label, score] for key, (label, score) in self._entries.items()]}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'name': self.name, 'entries': len(self._entries), 'hits': self.hits,
+                'misses': self.misses, 'rejects': self.rejects, 'invalidations': self.invalidations}
+
+
+_caches = []
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, bank):
+    """
+    按名称返回共享的 RecognitionCache（首次调用时从磁盘加载）。
+    """
+    with _caches_lock:
+        for cache in _caches:
+            if cache.name == name:
+                return cache
+        cache = RecognitionCache(name, bank)
+        _caches.append(cache)
+        return cache
+
+
+def save_caches():
+    with _caches_lock:
+        caches = list(_caches)
+    for cache in caches:
+        try:
+            cache.save()
+        except OSError as e:
+            logger.error(f"Failed to save recognition cache {cache.name}: {e}")
+
+
+def cache_stats():
+    with _caches_lock:
+        return [cache.stats() for cache in _caches]
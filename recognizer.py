@@ -2,66 +2,60 @@ import os
 from pathlib import Path
 from PIL import Image
 from typing import List, Optional, Dict
-from functools import lru_cache
 import cv2
 import numpy as np
 import re
 import logging
 from config import CARD_OUTPUT_DIR, DIGIT_PATTERN_DIR, TEMP_PATH, CARD_PATTERN_DIR, BACKUP_PATH
 import time
-import shutil
+from template_bank import get_bank
+from frame_ring import get_ring
 
 BINARYZATION_THRESHOLD = 210
 
-logger = logging.getLogger("my_logger")
+# 数字区域截图的二值化阈值（白色数字）
+DIGIT_THRESHOLD = 200
 
+# 数字最高匹配度不超过该值时记为异常，本局截图由环形缓冲导出
+OCR_LOW_SCORE = 0.9
 
-def match_pattern(pil_img,
-                      pattern_dir,
-                      important=1,
-                      threshold=0.8):
-    """
-    在 pil_img 中用 RGB 模板匹配寻找最佳匹配。
+logger = logging.getLogger("my_logger")
 
-    参数：
-      pil_img    -- PIL.Image 对象
-      pattern_dir-- 模板图片所在目录（.png）
-      threshold  -- 匹配阈值，float
-      important  -- 整数标志，1 表示“重要”：若 < threshold，则先 logger.critical 再返回 None；
-                    0 表示“不重要”：若 < threshold，直接返回 'nomatch'
 
-    返回：
-      best_name  -- 匹配度 ≥ threshold 时的模板名（去掉 .png 后缀）
+def to_rgb_array(pil_img) -> np.ndarray:
     """
-    # 1. 转成 numpy 数组并保留 RGB 三通道
-    img = np.array(pil_img)
+    把 PIL.Image 或 numpy 数组转成 RGB 三通道的 numpy 数组。
+    """
+    img = np.asarray(pil_img)
     if img.ndim == 3:
-        img = img[:, :, :3]
-    else:
-        # 如果是单通道也强制转成三通道（复制三次），以兼容彩色模板
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+        return img[:, :, :3]
+    # 如果是单通道也强制转成三通道（复制三次），以兼容彩色模板
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+
 
+def best_match(img: np.ndarray, pattern_dir):
+    """
+    逐个模板做 TM_CCOEFF_NORMED 匹配，返回 (best_name, best_val)。
+    """
     best_name = None
     best_val = 0.0
 
-    # 2. 遍历目录中所有 .png 模板
-    for fname in os.listdir(pattern_dir):
-        if not fname.lower().endswith('.png'):
-            continue
-        tpl_path = os.path.join(pattern_dir, fname)
-        template = cv2.imread(tpl_path, cv2.IMREAD_COLOR_RGB)
-        if template is None:
-            continue
-
-        # 3. 执行归一化系数模板匹配
+    # 遍历模板库中所有模板（已缓存在内存中）
+    for name, template in get_bank(pattern_dir).templates():
+        # 执行归一化系数模板匹配
         res = cv2.matchTemplate(img, template, cv2.TM_CCOEFF_NORMED)
         _, max_val, _, _ = cv2.minMaxLoc(res)
 
         if max_val > best_val:
             best_val = max_val
-            best_name = os.path.splitext(fname)[0]
+            best_name = name
+    return best_name, best_val
+
 
-    # 4. 判断返回
+def resolve_match(best_name, best_val, threshold=0.8, important=1):
+    """
+    按阈值判断匹配结果，语义同 match_pattern 的 important 参数。
+    """
     if best_val >= threshold:
         return best_name
     else:
@@ -72,29 +66,55 @@ def match_pattern(pil_img,
         else:
             return 'nomatch'
 
+
+def match_pattern(pil_img,
+                      pattern_dir,
+                      important=1,
+                      threshold=0.8):
+    """
+    在 pil_img 中用 RGB 模板匹配寻找最佳匹配。
+
+    参数：
+      pil_img    -- PIL.Image 对象
+      pattern_dir-- 模板图片所在目录（.png）
+      threshold  -- 匹配阈值，float
+      important  -- 整数标志，1 表示“重要”：若 < threshold，则先 logger.critical 再返回 None；
+                    0 表示“不重要”：若 < threshold，直接返回 'nomatch'
+
+    返回：
+      best_name  -- 匹配度 ≥ threshold 时的模板名（去掉 .png 后缀）
+    """
+    # 1. 转成 numpy 数组并保留 RGB 三通道
+    img = to_rgb_array(pil_img)
+
+    # 2. 与所有模板匹配
+    best_name, best_val = best_match(img, pattern_dir)
+
+    # 3. 判断返回
+    return resolve_match(best_name, best_val, threshold, important)
+
 DIGIT_FN_RE = re.compile(r"^(\d)\w*\.png$")
 
-@lru_cache(maxsize=1)
+def binarize_digit_template(tpl: np.ndarray) -> np.ndarray:
+    return cv2.threshold(tpl, BINARYZATION_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
+
+
 def load_digit_templates(pattern_dir: str) -> List[Dict]:
     """
-    只在第一次调用时加载所有模板：
+    从模板库取出数字模板（只在模板文件变化时重新加载）：
     返回 [{'digit': '0', 'tpl': ndarray, 'w':.., 'h':..}, ...]
     """
-    templates = []
-    for fn in os.listdir(pattern_dir):
-        m = DIGIT_FN_RE.match(fn)
-        if not m:
-            continue
-        digit = m.group(1)
-        path = os.path.join(pattern_dir, fn)
-        tpl = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        tpl = cv2.threshold(tpl, BINARYZATION_THRESHOLD, 255, cv2.THRESH_BINARY)[1]
-        if tpl is None:
-            continue
-        h, w = tpl.shape
-        # save_debug_image(tpl, f"template_{digit}")
-        templates.append({'digit': digit, 'tpl': tpl, 'w': w, 'h': h})
-    return templates
+    bank = get_bank(pattern_dir, cv2.IMREAD_GRAYSCALE, binarize_digit_template, DIGIT_FN_RE)
+
+    def build(items):
+        templates = []
+        for name, tpl in items:
+            h, w = tpl.shape
+            # save_debug_image(tpl, f"template_{name[0]}")
+            templates.append({'digit': name[0], 'tpl': tpl, 'w': w, 'h': h})
+        return templates
+
+    return bank.derived('digits', build)
 
 def save_debug_image(img: np.ndarray, step: str):
     """
@@ -126,10 +146,9 @@ def ocr_number(
     gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
     # save_debug_image(gray, "step2_gray")
 
-    # 2. Otsu 二值化
-    _, bw = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-    _, bw = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
-    # save_debug_image(bw, "step3_bw_otsu")
+    # 2. 固定阈值二值化
+    _, bw = cv2.threshold(gray, DIGIT_THRESHOLD, 255, cv2.THRESH_BINARY)
+    # save_debug_image(bw, "step3_bw")
 
     # 3. 开运算去噪
     # kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
@@ -171,17 +190,10 @@ def ocr_number(
     #! 6. 打印最高匹配度
     highest = max(m['score'] for m in raw_matches)
     # logger.warning(f"[OCR] Highest match score: {highest:.4f}")
-    if highest <= 0.9:
+    if highest <= OCR_LOW_SCORE:
         logger.error(f"[OCR] Warning: Highest match score is low ({highest:.4f})")
-        os.makedirs(BACKUP_PATH, exist_ok=True)
-        for item in os.listdir(CARD_OUTPUT_DIR):
-            src = os.path.join(CARD_OUTPUT_DIR, item)
-            dst = os.path.join(BACKUP_PATH, item)
-            if os.path.isdir(src):
-                shutil.copytree(src, dst, dirs_exist_ok=True)
-            else:
-                shutil.copy2(src, dst)
-                
+        # 本局截图在内存环形缓冲里，局末由 card_capture 在后台导出
+        get_ring().flag('ocr_low_score', score=highest)
 
     # 7. 全局按置信度降序，做 NMS
     raw_matches.sort(key=lambda x: x['score'], reverse=True)
@@ -208,14 +220,21 @@ def ocr_number(
 
     # 8. 按 x 排序，拼数字
     selected.sort(key=lambda x: x['pt'][0])
-    s = ''.join(m['digit'] for m in selected)
-    if int(s) == 0:
-        logger.critical(f"WRONG OCR number: {s}")
-        return 999
+    return number_from_digits(''.join(m['digit'] for m in selected))
+
+
+def number_from_digits(s: str) -> Optional[int]:
+    """
+    识别出的数字串转成数量；识别成 0（'0'、'00'）说明识别错误，返回 999。
+    """
     try:
-        return int(s)
+        value = int(s)
     except ValueError:
         return None
+    if value == 0:
+        logger.critical(f"WRONG OCR number: {s}")
+        return 999
+    return value
     
 if __name__ == "__main__":
     # 测试函数
@@ -0,0 +1,231 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+from config import MODE_PATTERN_DIR, MODE_REGION, DATA_DIR
+
+# Directories searched (recursively) for full screenshots to use as in-game frames
+FRAME_DIRS = ('captures', 'backup')
+
+# One pass through the game as main.py plays it. Each step is shown until its
+# condition is met: 'taps' inputs received, 'frames' screenshots served, or
+# 'seconds' of (virtual) time spent in the step. 'result' is replaced by win/lose.
+INTRO_SCRIPT = (
+    ('home', {'taps': 1}),
+)
+ROUND_SCRIPT = (
+    ('main', {'taps': 1}),
+    ('select', {'taps': 2}),
+    ('loading', {'frames': 1}),
+    ('ingame', {'taps': 1}),
+    ('result', {'frames': 2}),
+    ('clearing', {'taps': 1}),
+    ('interm', {'frames': 2}),
+)
+
+
+class ReplayFinished(Exception):
+    """
+    Raised by ReplayDevice.screenshot() once the requested number of rounds has been played.
+    """
+
+
+def load_frames(dirs=FRAME_DIRS):
+    """
+    All stored full screenshots as (H, W, 4) RGBA arrays, like raw captures.
+    """
+    paths = sorted({p for d in dirs for p in glob.glob(os.path.join(d, '**', '*full_screenshot.png'),
+                                                         recursive=True)})
+    return [np.asarray(Image.open(p).convert('RGBA')) for p in paths]
+
+
+def synthesize(frame, state, pattern_dir=MODE_PATTERN_DIR):
+    """
+    A copy of `frame` with the mode template for `state` pasted over MODE_REGION.
+    """
+    x, y, w, h = MODE_REGION
+    template = np.asarray(Image.open(os.path.join(pattern_dir, f"{state}.png")).convert('RGB'))
+    out = frame.copy()
+    out[y:y + h, x:x + w, :3] = template[:h, :w]
+    out[y:y + h, x:x + w, 3] = 255
+    out.flags.writeable = False
+    return out
+
+
+class ReplayDevice:
+    """
+    A fake device that plays a scripted game from stored screenshots.
+
+    Each script step serves a frame for one screen (a stored full screenshot with
+    that screen's mode template pasted in) and advances on taps, on frames served,
+    or on virtual time. sleep() only advances the virtual clock, so main.py runs at
+    full speed. In-game rounds cycle through the stored screenshots and alternate
+    win/lose. Every input is recorded in `inputs`. After `rounds` rounds the next
+    screenshot() raises ReplayFinished.
+    """
+    name = 'replay'
+    realtime = False
+
+    def __init__(self, frames=None, rounds=None, results=('win', 'lose'),
+                 intro=INTRO_SCRIPT, script=ROUND_SCRIPT, name=None):
+        frames = load_frames() if frames is None else frames
+        if not frames:
+            raise ValueError("no screenshots to replay")
+        if name is not None:
+            self.name = name
+        self.rounds = rounds
+        self.results = list(results)
+        self.intro = list(intro)
+        self.script = list(script)
+        self.inputs = []
+        self.served = 0
+        self.completed = 0
+        self.clock = 0.0
+        # Frames are built once; non-ingame screens reuse the first stored screenshot
+        states = {state for state, _ in self.intro + self.script if state not in ('ingame', 'result')}
+        states.update(self.results)
+        self._screens = {state: synthesize(frames[0], state) for state in states}
+        self._ingame = [synthesize(frame, 'ingame') for frame in frames]
+        self._steps = self.intro + self.script
+        self._index = 0
+        self._enter()
+
+    def _enter(self):
+        self._taps = 0
+        self._frames = 0
+        self._entered = self.clock
+
+    @property
+    def state(self):
+        state = self._steps[self._index][0]
+        if state == 'result':
+            return self.results[self.completed % len(self.results)]
+        return state
+
+    def _frame(self):
+        state = self.state
+        if state == 'ingame':
+            return self._ingame[self.completed % len(self._ingame)]
+        return self._screens[state]
+
+    def _advance(self):
+        # Move on while the current step's condition is met (time can skip several steps)
+        while True:
+            _, until = self._steps[self._index]
+            done = (('taps' in until and self._taps >= until['taps'])
+                    or ('frames' in until and self._frames >= until['frames'])
+                    or ('seconds' in until and self.clock - self._entered >= until['seconds']))
+            if not done:
+                return
+            self._index += 1
+            if self._index == len(self._steps):
+                self.completed += 1
+                self._index = len(self.intro)
+            self._enter()
+
+    def connect(self, timeout=None):
+        return True
+
+    def screenshot(self):
+        if self.rounds is not None and self.completed >= self.rounds:
+            raise ReplayFinished(f"replayed {self.completed} rounds")
+        frame = self._frame()
+        self.served += 1
+        self._frames += 1
+        self._advance()
+        return frame
+
+    def _input(self, kind, x, y):
+        self.inputs.append({'kind': kind, 'x': x, 'y': y, 'state': self.state, 'time': self.clock})
+        self._taps += 1
+        self._advance()
+
+    def tap(self, x, y):
+        self._input('tap', x, y)
+
+    def double_tap(self, x, y, interval=0.2):
+        self.clock += interval
+        self._input('double_tap', x, y)
+
+    def sleep(self, seconds):
+        self.clock += seconds
+        self._advance()
+
+    def stats(self):
+        return {'rounds': self.completed, 'frames': self.served, 'inputs': len(self.inputs),
+                'virtual_seconds': round(self.clock, 2)}
+
+
+def run(rounds=20, data_path=DATA_DIR, verbose=False, devices=1):
+    """
+    Play `rounds` rounds of main.py against a ReplayDevice, writing to a temporary
+    copy of `data_path`, and report the end-to-end rounds per second. With
+    `devices` > 1 that many replay devices play `rounds` rounds each through the
+    DevicePool, sharing the model and dataset writer.
+    """
+    import main as game
+    from dataset_store import snapshot, count_rows
+    from debug_writer import DebugWriter, set_debug_writer
+    from frame_ring import FrameRing, set_ring
+    from metrics import Metrics, set_metrics
+
+    frames = load_frames()
+    replays = [ReplayDevice(frames, rounds=rounds, name=f'replay-{i}') for i in range(devices)]
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    data_copy = os.path.join(workdir, os.path.basename(os.path.normpath(data_path)))
+    if os.path.exists(data_path):
+        snapshot(data_path, data_copy)
+    rows_before = count_rows(data_copy) if os.path.exists(data_copy) else 0
+    # Replayed frames must not overwrite the stored screenshots they come from
+    set_debug_writer(DebugWriter('off'))
+    set_ring(FrameRing(writer=DebugWriter('off')))
+    # Stage timings are kept in memory and summarised below instead of exported
+    metrics = Metrics(path=None)
+    set_metrics(metrics)
+    if not verbose:
+        logging.disable(logging.CRITICAL)
+
+    start = time.perf_counter()
+    try:
+        game.main(devices=replays, data_dir=data_copy, retrain=False, finished=(ReplayFinished,),
+                  ring_factory=lambda device: FrameRing(writer=DebugWriter('off')))
+    except ReplayFinished:
+        pass
+    finally:
+        logging.disable(logging.NOTSET)
+    elapsed = time.perf_counter() - start
+    rows = count_rows(data_copy) - rows_before
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    completed = sum(device.completed for device in replays)
+    served = sum(device.served for device in replays)
+    inputs = sum(len(device.inputs) for device in replays)
+    stats = {'devices': devices, 'rounds': completed, 'frames': served, 'inputs': inputs,
+             'seconds': round(elapsed, 3), 'rows_written': rows,
+             'rounds_per_second': round(completed / elapsed, 2) if elapsed > 0 else None}
+    print(f"Replayed {completed} rounds on {devices} device(s) in {elapsed:.2f}s "
+          f"({stats['rounds_per_second']} rounds/s, {served} frames, "
+          f"{inputs} inputs, {rows} rows written)")
+    for hist in metrics.snapshot()['histograms']:
+        if hist['name'] == 'stage_seconds':
+            device = f"{hist['labels']['device']:10s} " if 'device' in hist['labels'] else ''
+            print(f"  {device}{hist['labels']['stage']:12s} n={hist['count']:5d}  "
+                  f"mean {hist['mean_ms']:8.3f}ms  p95 {hist['p95_ms']:8.3f}ms")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the game loop offline against recorded screenshots.')
+    parser.add_argument('--rounds', type=int, default=20, help='rounds to play before stopping')
+    parser.add_argument('--data', default=DATA_DIR, help='dataset to copy for the run (never modified)')
+    parser.add_argument('--verbose', action='store_true', help='keep the game loop logging')
+    parser.add_argument('--devices', type=int, default=1, help='replay devices played concurrently')
+    args = parser.parse_args()
+    run(args.rounds, args.data, args.verbose, args.devices)
+    sys.exit(0)
@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import accuracy_score
+from config import (TEMP_PATH, RETRAIN_MIN_HOLDOUT, INCREMENTAL_TRAINING, FULL_RETRAIN_EVERY,
+                    INCREMENTAL_HOLDOUT, INCREMENTAL_SELECT)
+from train_models import (load_raw, augment, train_candidates, update_candidates, training_config,
+                          INCREMENTAL_CANDIDATES)
+from dataset_store import count_rows, snapshot, is_store, STORE_SUFFIX
+from model_registry import ModelRegistry, dataset_hash, config_hash
+
+logger = logging.getLogger("my_logger")
+
+
+def retrain_job(snapshot_path, trained_rows, current_model, min_holdout=RETRAIN_MIN_HOLDOUT):
+    """
+    在子进程中运行的全量重训练任务。
+
+    当前模型训练之后新增的行（至少 min_holdout 行，最多一半数据）作为 holdout，
+    两个模型都没见过这些行；新模型只用 holdout 之前的行训练，然后在 holdout 上和当前模型比较。
+    """
+    start = time.time()
+    df = load_raw(snapshot_path)
+    rows = len(df)
+    holdout = min(max(rows - trained_rows, min_holdout), rows // 2)
+    train_df, hold_df = df.iloc[:rows - holdout], df.iloc[rows - holdout:]
+
+    X, y = augment(train_df)
+    models, results, _, _ = train_candidates(X, y)
+    best_name = max(results, key=results.get)
+
+    X_hold, y_hold = augment(hold_df)
+    return {
+        'kind': 'full',
+        'name': best_name,
+        'model': models[best_name],
+        'candidates': models,
+        'rows': rows,
+        'train_rows': rows - holdout,
+        'holdout_rows': holdout,
+        'new_acc': accuracy_score(y_hold, models[best_name].predict(X_hold)),
+        'current_acc': accuracy_score(y_hold, current_model.predict(X_hold)),
+        'duration': time.time() - start,
+    }
+
+
+def incremental_job(snapshot_path, trained_rows, current_model, candidates,
+                    holdout_ratio=INCREMENTAL_HOLDOUT, select_ratio=INCREMENTAL_SELECT):
+    """
+    在子进程中运行的增量更新任务：只用检查点（trained_rows）之后的新行更新候选模型。
+
+    新行按时间顺序分成三段：更新段、挑选段（select_ratio）和 holdout（最新的 holdout_ratio）。
+    后两段不参与本次更新（下次更新时会用上）。最佳候选在挑选段上选出，
+    再在 holdout 上和当前模型比较，这样比较结果不会因为挑选而偏高。
+    updated 表示选中的候选本次是否真的被更新过（不支持增量更新的模型原样保留）。
+    """
+    start = time.time()
+    df = load_raw(snapshot_path)
+    rows = len(df)
+    new_rows = rows - trained_rows
+    holdout = max(int(new_rows * holdout_ratio), 1)
+    select = max(int(new_rows * select_ratio), 1)
+    update_df = df.iloc[trained_rows:rows - holdout - select]
+    select_df, hold_df = df.iloc[rows - holdout - select:rows - holdout], df.iloc[rows - holdout:]
+
+    X_new, y_new = augment(update_df)
+    X_select, y_select = augment(select_df)
+    X_hold, y_hold = augment(hold_df)
+    models, results = update_candidates(candidates, X_new, y_new, X_select, y_select)
+    best_name = max(results, key=results.get)
+    return {
+        'kind': 'incremental',
+        'name': best_name,
+        'model': models[best_name],
+        'candidates': models,
+        'updated': best_name in INCREMENTAL_CANDIDATES,
+        'rows': rows,
+        'train_rows': rows - holdout - select,
+        'holdout_rows': holdout + select,
+        'new_acc': accuracy_score(y_hold, models[best_name].predict(X_hold)),
+        'current_acc': accuracy_score(y_hold, current_model.predict(X_hold)),
+        'duration': time.time() - start,
+    }
+
+
+class BackgroundRetrainer:
+    """
+    在后台进程中重训练模型，主循环不会被阻塞。
+
+    submit() 把数据集快照一份后提交训练任务（已有任务在跑时忽略）：有保存的候选模型时只用新增行做增量更新，
+    每 FULL_RETRAIN_EVERY 次才全量训练一次。
+    主循环在两局之间调用 poll()，新模型在 holdout 上优于当前模型时返回新模型，否则返回 None。
+    换入的新模型同时保存到模型仓库，下次启动直接加载。
+    """
+
+    def __init__(self, data_path, model, meta=None, registry=None):
+        self.data_path = data_path
+        self.model = model
+        self.registry = registry or ModelRegistry()
+        meta = meta or {}
+        self.trained_rows = meta['rows'] if 'rows' in meta else count_rows(data_path)
+        self.updates_since_full = meta.get('updates_since_full', 0)
+        self.candidates = None
+        if INCREMENTAL_TRAINING and 'version' in meta:
+            self.candidates = self.registry.load_candidates(meta['version'])
+        snapshot_name = 'retrain_snapshot' + (STORE_SUFFIX if is_store(data_path) else '.csv')
+        self.snapshot_path = os.path.join(TEMP_PATH, snapshot_name)
+        self._snapshot_hash = None
+        self._executor = None
+        self._future = None
+
+    def running(self):
+        return self._future is not None and not self._future.done()
+
+    def submit(self):
+        if self.running():
+            logger.info("Retrain already running, skipped")
+            return False
+        os.makedirs(TEMP_PATH, exist_ok=True)
+        snapshot(self.data_path, self.snapshot_path)
+        new_rows = count_rows(self.snapshot_path) - self.trained_rows
+        incremental = (INCREMENTAL_TRAINING and self.candidates is not None
+                       and self.updates_since_full + 1 < FULL_RETRAIN_EVERY)
+        # 增量更新把新行分成更新、挑选、holdout 三段，每段至少一行
+        if incremental and new_rows < 3:
+            logger.info("No new rows since last checkpoint, retrain skipped")
+            return False
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=1)
+        # 按提交次数排期：每 FULL_RETRAIN_EVERY 次中有一次全量训练（无论结果是否被采用）
+        self.updates_since_full = self.updates_since_full + 1 if incremental else 0
+        self._snapshot_hash = dataset_hash(self.snapshot_path)
+        if incremental:
+            self._future = self._executor.submit(
+                incremental_job, self.snapshot_path, self.trained_rows, self.model, self.candidates)
+        else:
+            self._future = self._executor.submit(
+                retrain_job, self.snapshot_path, self.trained_rows, self.model)
+        logger.info(f"Background {'incremental update' if incremental else 'full retrain'} started "
+                    f"({new_rows} new rows)")
+        return True
+
+    def poll(self):
+        """
+        非阻塞地检查后台任务，需要换模型时返回新模型。
+        """
+        if self._future is None or not self._future.done():
+            return None
+        future, self._future = self._future, None
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"Background retrain failed: {e}")
+            return None
+
+        summary = (f"{result['kind']} {result['name']}, "
+                   f"rows={result['train_rows']}+{result['holdout_rows']} holdout, "
+                   f"new={result['new_acc']:.4f} current={result['current_acc']:.4f}, "
+                   f"took {result['duration']:.1f}s")
+        # 选中的候选本次没有更新时，它就是仓库里已有的模型，不另存一个新版本
+        if not result.get('updated', True):
+            logger.warning(f"New model rejected (best candidate was not updated): {summary}")
+            return None
+        # 只有在 holdout 上严格更好时才换入
+        if not result['new_acc'] > result['current_acc']:
+            logger.warning(f"New model rejected: {summary}")
+            return None
+
+        self.model = result['model']
+        self.candidates = result['candidates'] if INCREMENTAL_TRAINING else None
+        self.trained_rows = result['train_rows']
+        meta = self.registry.save(self.model, {
+            'model': result['name'],
+            'accuracy': result['new_acc'],
+            'data_hash': self._snapshot_hash,
+            'config_hash': config_hash(training_config()),
+            'rows': result['train_rows'],
+            'updates_since_full': self.updates_since_full,
+        }, candidates=self.candidates)
+        logger.error(f"New model promoted as {meta['version']}: {summary}")
+        return self.model
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
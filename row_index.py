@@ -0,0 +1,126 @@
+import numpy as np
+
+NEW = 'new'
+DUPLICATE = 'duplicate'
+MIRROR = 'mirror'
+
+
+# 分块计算哈希的行数
+CHUNK_ROWS = 262144
+
+
+def canonical_rows(values):
+    """
+    符号归一化：每行乘以自身第一个非零值的符号，使一行和它的取反得到同一个规范形式。
+    返回 (规范形式，与输入同类型, 每行的符号 +1/-1，全零行为 0)。
+    """
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values[None, :]
+    first = (values != 0).argmax(axis=1)
+    sign = np.sign(values[np.arange(len(values)), first]).astype(np.int8)
+    canonical = values * np.where(sign == 0, 1, sign).astype(values.dtype)[:, None]
+    return canonical, sign
+
+
+def _column_weights(ncols):
+    # 每列一个固定的随机奇数权重，使同一组值出现在不同列时哈希不同；
+    # 不能用元素哈希本身生成（列号和数值相同时乘积对称，会系统性碰撞）
+    rng = np.random.default_rng(0x5EED)
+    return rng.integers(0, 2**63, size=ncols, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def row_keys(values):
+    """
+    每行规范形式的 64 位哈希（一行与其取反的哈希相同）和符号。
+    各元素先按 int64 做 pandas 的整数哈希，再按列加权求和（uint64 溢出回绕），单行和整表的结果一致。
+    返回 (哈希, 符号, 规范形式)。
+    """
+    # pandas 只在这里用到，导入 row_index 时不加载
+    import pandas as pd
+    canonical, sign = canonical_rows(values)
+    weights = _column_weights(canonical.shape[1])
+    keys = np.empty(len(canonical), dtype=np.uint64)
+    for i in range(0, len(canonical), CHUNK_ROWS):
+        chunk = canonical[i:i + CHUNK_ROWS].astype(np.int64)
+        hashed = pd.util.hash_array(chunk.ravel()).reshape(chunk.shape)
+        keys[i:i + CHUNK_ROWS] = (hashed * weights).sum(axis=1, dtype=np.uint64)
+    return keys, sign, canonical
+
+
+def find_redundant(values):
+    """
+    一次向量化处理找出重复行和完全相反行（均以首次出现的规范形式为准）。
+    返回 (重复行掩码, 相反行掩码, 每行对应的首次出现行号)。哈希相同的行会再逐列比较确认。
+    """
+    keys, sign, canonical = row_keys(values)
+    _, first_of_key, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    first = first_of_key[inverse.ravel()]
+    same = (canonical == canonical[first]).all(axis=1)
+    later = (np.arange(len(keys)) != first) & same
+    duplicate = later & (sign == sign[first])
+    mirror = later & (sign != sign[first])
+    return duplicate, mirror, first
+
+
+class RowIndex:
+    """
+    数据集行的规范形式哈希索引，用于新行写入前判断它是否与已有行重复或完全相反。
+
+    索引只保存 哈希 -> (首次出现的行号, 符号)，写入时增量更新；64 位哈希在百万行量级下碰撞可以忽略。
+    """
+
+    def __init__(self):
+        self._first = {}
+        self.rows = 0
+
+    @classmethod
+    def from_values(cls, values):
+        index = cls()
+        values = np.asarray(values)
+        if len(values):
+            keys, sign, _ = row_keys(values)
+            # np.unique 返回每个哈希首次出现的位置
+            _, first = np.unique(keys, return_index=True)
+            index._first = dict(zip(keys[first].tolist(), zip(first.tolist(), sign[first].tolist())))
+            index.rows = len(values)
+        return index
+
+    @classmethod
+    def from_dataset(cls, path):
+        """
+        从已有数据集（CSV 或 .store）建立索引，文件不存在时返回空索引。
+        """
+        import os
+        from dataset_store import load_dataframe
+        if not os.path.exists(path) or (os.path.isfile(path) and os.path.getsize(path) == 0):
+            return cls()
+        return cls.from_values(load_dataframe(path).to_numpy())
+
+    def check(self, row):
+        """
+        返回 (状态, 首次出现的行号)：状态为 NEW / DUPLICATE / MIRROR，NEW 时行号为 None。
+        """
+        keys, sign, _ = row_keys(row)
+        hit = self._first.get(int(keys[0]))
+        if hit is None:
+            return NEW, None
+        first, first_sign = hit
+        return (DUPLICATE if first_sign == int(sign[0]) else MIRROR), first
+
+    def add(self, row):
+        """
+        登记一行已写入数据集（成为第 rows 行），返回同 check；只有 NEW 的行会加入哈希表。
+        """
+        keys, sign, _ = row_keys(row)
+        key = int(keys[0])
+        hit = self._first.get(key)
+        self.rows += 1
+        if hit is None:
+            self._first[key] = (self.rows - 1, int(sign[0]))
+            return NEW, None
+        first, first_sign = hit
+        return (DUPLICATE if first_sign == int(sign[0]) else MIRROR), first
+
+    def __len__(self):
+        return len(self._first)
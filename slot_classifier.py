@@ -0,0 +1,171 @@
+import time
+import numpy as np
+from PIL import Image
+from config import CARD_PATTERN_DIR, RECOGNITION_CACHE
+from recognizer import to_rgb_array, best_match
+from template_bank import get_bank
+from recognition_cache import get_cache
+
+
+def _normalize_rows(mat: np.ndarray, channels: int) -> np.ndarray:
+    """
+    每行减去逐通道均值后归一化为单位向量。
+
+    两个这样处理过的向量的点积，正好等于同尺寸图像上 cv2.TM_CCOEFF_NORMED 的匹配值。
+    方差为 0 的行保持全 0（对应 OpenCV 返回 0）。
+    """
+    n = mat.shape[0]
+    mat = mat.reshape(n, -1, channels).astype(np.float32)
+    mat -= mat.mean(axis=1, keepdims=True)
+    mat = mat.reshape(n, -1)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    mat /= norms
+    return mat
+
+
+def _crop_rows(imgs, channels: int):
+    """
+    截图展平成 float32 行（不去均值），以及每行逐通道去均值后的范数。
+
+    模板行已逐通道去均值（每个通道之和为 0），所以 x·t 与 (x - 均值)·t 相等，
+    相关系数 = (rows @ templates.T) / 范数，截图本身不必去均值和归一化。
+    逐通道求和用全 1 行向量的矩阵乘法，比沿跨步的像素轴求均值快得多。
+    """
+    n = len(imgs)
+    rows = np.stack(imgs).reshape(n, -1).astype(np.float32)
+    pixels = rows.shape[1] // channels
+    sums = (np.ones((1, pixels), dtype=np.float32) @ rows.reshape(n, pixels, channels))[:, 0, :]
+    squares = np.einsum('ij,ij->i', rows, rows, dtype=np.float64)
+    norms = np.sqrt(np.maximum(squares - (sums.astype(np.float64) ** 2).sum(axis=1) / pixels, 0.0))
+    norms[norms == 0] = 1.0
+    return rows, norms
+
+
+def _build_matrix(items):
+    """
+    把模板库堆成 (n_templates, H*W*C) 的归一化矩阵，尺寸不一致时返回 None。
+    """
+    if not items:
+        return None
+    shapes = {tpl.shape for _, tpl in items}
+    if len(shapes) != 1:
+        return None
+    shape = shapes.pop()
+    names = [name for name, _ in items]
+    stacked = np.stack([tpl for _, tpl in items])
+    return names, shape, np.ascontiguousarray(_normalize_rows(stacked, shape[-1]))
+
+
+def _name_index(items):
+    return {name: i for i, (name, _) in enumerate(items)}
+
+
+class SlotClassifier:
+    """
+    卡槽批量识别：所有卡槽截图一次矩阵乘法与全部模板算出相关系数。
+
+    卡槽截图和模板尺寸相同（112x112），每次比较只有一个 TM_CCOEFF_NORMED 值，
+    因此可以把截图和模板都展平、归一化，然后 scores = crops @ templates.T。
+    模板尺寸不统一或截图尺寸不符时退回逐模板 cv2.matchTemplate。
+
+    启用识别缓存时，感知哈希命中的截图只与缓存的那个模板算一次点积复核，
+    只有未命中（或复核不通过）的截图参与和全部模板的矩阵乘法。
+    """
+
+    def __init__(self, pattern_dir=CARD_PATTERN_DIR, cache=RECOGNITION_CACHE):
+        self.pattern_dir = pattern_dir
+        self.bank = get_bank(pattern_dir)
+        self.cache = get_cache('slots', self.bank) if cache else None
+
+    def _matrix(self):
+        return self.bank.derived('slot_matrix', _build_matrix)
+
+    def scores(self, crops):
+        """
+        返回 (names, scores)，scores 形状为 (len(crops), n_templates)；不能批量计算时返回 None。
+        """
+        matrix = self._matrix()
+        if matrix is None:
+            return None
+        names, shape, templates = matrix
+        imgs = [to_rgb_array(crop) for crop in crops]
+        if any(img.shape != shape for img in imgs):
+            return None
+        rows, norms = _crop_rows(imgs, shape[-1])
+        return names, (rows @ templates.T) / norms[:, None]
+
+    def classify(self, crops):
+        """
+        返回每个截图的 [(best_name, best_score), ...]。
+        """
+        matrix = self._matrix()
+        imgs = [to_rgb_array(crop) for crop in crops]
+        if matrix is None or any(img.shape != matrix[1] for img in imgs):
+            return [best_match(img, self.pattern_dir) for img in imgs]
+        names, shape, templates = matrix
+        rows, norms = _crop_rows(imgs, shape[-1])
+        results = [None] * len(imgs)
+        keys = [None] * len(imgs)
+        if self.cache is not None:
+            index = self.bank.derived('slot_index', _name_index)
+            for row, img in enumerate(imgs):
+                keys[row], cached = self.cache.lookup(img)
+                if cached is None:
+                    continue
+                score = float(rows[row] @ templates[index[cached]] / norms[row]) if cached in index else 0.0
+                if score >= self.cache.min_score:
+                    results[row] = (cached, score)
+                else:
+                    self.cache.reject(keys[row])
+        missed = [row for row, result in enumerate(results) if result is None]
+        if missed:
+            scores = (rows[missed] @ templates.T) / norms[missed, None]
+            best = scores.argmax(axis=1)
+            for i, row in enumerate(missed):
+                results[row] = (names[best[i]], float(scores[i, best[i]]))
+                if self.cache is not None:
+                    self.cache.store(keys[row], *results[row])
+        return results
+
+
+_classifier = None
+
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        _classifier = SlotClassifier()
+    return _classifier
+
+
+def compare_with_loop(crops, repeat=20):
+    """
+    对比逐个 match_pattern 循环与批量矩阵识别的结果和耗时。
+    """
+    classifier = get_classifier()
+    loop = [best_match(to_rgb_array(crop), CARD_PATTERN_DIR) for crop in crops]
+    batch = classifier.classify(crops)
+    for (ln, lv), (bn, bv) in zip(loop, batch):
+        flag = 'OK ' if ln == bn else 'DIFF'
+        print(f"{flag} loop={ln} ({lv:.4f})  batch={bn} ({bv:.4f})")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        [best_match(to_rgb_array(crop), CARD_PATTERN_DIR) for crop in crops]
+    loop_ms = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        classifier.classify(crops)
+    batch_ms = (time.perf_counter() - start) / repeat * 1000
+    print(f"{len(crops)} slots: loop {loop_ms:.2f}ms, batch {batch_ms:.2f}ms, "
+          f"speedup x{loop_ms / batch_ms:.1f}")
+
+
+if __name__ == '__main__':
+    for folder in ('captures/slots', 'backup'):
+        crops = [Image.open(f"{folder}/{side}_{idx}_masked.png")
+                 for side in ('left', 'right') for idx in (1, 2, 3)]
+        print(f"== {folder}")
+        compare_with_loop(crops)
@@ -0,0 +1,211 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from config import STARTUP_PROFILE_PATH, STARTUP_DEFER_LIMIT
+
+logger = logging.getLogger("my_logger")
+
+
+class Deferred:
+    """
+    A value computed on a background thread. get() waits for it and returns it,
+    re-raising whatever the computation raised.
+    """
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self._done = threading.Event()
+        self._thread = None
+        self._value = None
+        self._error = None
+        self.on_done = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'deferred-{self.name}', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._value = self.fn()
+        except BaseException as e:
+            self._error = e
+            logger.error(f"Background {self.name} failed: {e}")
+        finally:
+            self._done.set()
+            if self.on_done is not None:
+                self.on_done(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        """
+        The computed value; starts the computation if nobody has yet.
+        """
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name} not ready after {timeout}s")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class StartupProfile:
+    """
+    Timeline of process startup, written to `path` as JSON.
+
+    Time zero is when this module is first imported (main.py imports it before
+    anything else). `mark()` records a named point once, `phase()` times a block
+    (on any thread). Work that is not needed for the first action is registered
+    with `defer()`: it starts when the first action is marked -- so it does not
+    compete with the critical path for the GIL -- or after `defer_limit` seconds,
+    whichever comes first. The profile is written at the first action and again
+    once every deferred task has finished.
+    """
+
+    def __init__(self, path=STARTUP_PROFILE_PATH, defer_limit=STARTUP_DEFER_LIMIT):
+        self.t0 = time.perf_counter()
+        self.started = time.time()
+        self.path = path
+        self.defer_limit = defer_limit
+        self.marks = {}
+        self.phases = []
+        self._pending = []
+        self._deferred = []
+        self._released = False
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def mark(self, name, **info):
+        """
+        Record `name` the first time it is reached. Marking 'first_action' starts deferred work.
+        """
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = dict(info, at=round(self.elapsed(), 4))
+        if name == 'first_action':
+            logger.info(f"First action {self.marks[name]['at'] * 1000:.0f}ms after startup")
+            self.release()
+            self.write()
+
+    @contextmanager
+    def phase(self, name):
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            end = self.elapsed()
+            with self._lock:
+                self.phases.append({'name': name, 'start': round(start, 4), 'seconds': round(end - start, 4),
+                                    'thread': threading.current_thread().name})
+
+    def defer(self, name, fn, after_first_action=True):
+        """
+        Run `fn` in the background, once the first action is done unless
+        `after_first_action` is False (work the first action itself benefits from).
+        Returns its Deferred.
+        """
+        deferred = Deferred(name, lambda: self._timed(name, fn))
+        deferred.on_done = self._finished
+        with self._lock:
+            self._deferred.append(deferred)
+            if after_first_action and not self._released:
+                self._pending.append(deferred)
+                if self._timer is None and self.defer_limit is not None:
+                    self._timer = threading.Timer(self.defer_limit, self.release)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return deferred
+        return deferred.start()
+
+    def _timed(self, name, fn):
+        with self.phase(name):
+            return fn()
+
+    def _finished(self, deferred):
+        with self._lock:
+            if not all(d.done() for d in self._deferred):
+                return
+        self.write()
+
+    def release(self):
+        """
+        Start all deferred work now.
+        """
+        with self._lock:
+            self._released = True
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+        for deferred in pending:
+            deferred.start()
+
+    def snapshot(self):
+        with self._lock:
+            return {'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                    'marks': dict(self.marks), 'phases': sorted(self.phases, key=lambda p: p['start']),
+                    'deferred': {d.name: d.done() for d in self._deferred}}
+
+    def write(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, indent=2)
+        except OSError as e:
+            logger.error(f"Failed to write startup profile {path}: {e}")
+
+
+def _blank_frame():
+    import numpy as np
+    from config import (LEFT_BOTTOM_REGIONS, RIGHT_BOTTOM_REGIONS, LEFT_BOTTOM_NUMS, RIGHT_BOTTOM_NUMS,
+                        MODE_REGION, MAP_REGION)
+
+    regions = LEFT_BOTTOM_REGIONS + RIGHT_BOTTOM_REGIONS + LEFT_BOTTOM_NUMS + RIGHT_BOTTOM_NUMS
+    regions += [MODE_REGION, MAP_REGION]
+    width = max(x + w for x, y, w, h in regions)
+    height = max(y + h for x, y, w, h in regions)
+    return np.zeros((height, width, 4), dtype=np.uint8)
+
+
+def warm_modes():
+    """
+    Load the mode templates and run one detection on a blank frame, so template
+    files and OpenCV's first-call setup are paid while the device connects rather
+    than on the first real frame.
+    """
+    from image_processor import get_extractor
+    from mode_detector import ModeDetector
+    ModeDetector(gate=False, cache=False).detect(get_extractor().mode(_blank_frame()))
+
+
+def warm_capture():
+    """
+    Load the slot and digit templates (and their derived matrices) with one blank pass.
+    """
+    from image_processor import get_extractor
+    from slot_classifier import get_classifier
+    from digit_reader import get_digit_reader
+    frame = _blank_frame()
+    extractor = get_extractor()
+    get_classifier().classify(list(extractor.slots(frame)))
+    reader = get_digit_reader()
+    for crop in extractor.nums(frame):
+        reader.read_digits(crop)
+
+
+_profile = StartupProfile()
+
+
+def get_profile():
+    return _profile
@@ -0,0 +1,143 @@
+import os
+import re
+import time
+import threading
+import cv2
+import numpy as np
+from config import TEMPLATE_CHECK_INTERVAL
+
+PNG_RE = re.compile(r"^.+\.png$", re.IGNORECASE)
+
+
+class TemplateBank:
+    """
+    一个模板目录的内存缓存。
+
+    模板只在第一次使用时读入，之后仅当文件的 mtime 变化、或有文件新增/删除时才重新加载
+    对应文件。目录扫描最多每 check_interval 秒一次，其余调用不做任何文件系统操作。
+
+    参数：
+      pattern_dir    -- 模板目录
+      flags          -- cv2.imread 的读取方式
+      preprocess     -- 可选，读入后对模板做的预处理（如二值化），返回 ndarray
+      name_re        -- 文件名过滤正则，默认所有 .png
+      check_interval -- 两次目录扫描之间的最短间隔（秒），0 表示每次调用都检查
+    """
+
+    def __init__(self, pattern_dir, flags=cv2.IMREAD_COLOR_RGB, preprocess=None,
+                 name_re=PNG_RE, check_interval=TEMPLATE_CHECK_INTERVAL):
+        self.pattern_dir = pattern_dir
+        self.flags = flags
+        self.preprocess = preprocess
+        self.name_re = name_re
+        self.check_interval = check_interval
+        self.version = 0        # 模板集合每变化一次加 1，供派生缓存判断是否失效
+        self.hits = 0           # 直接用内存中模板返回的次数
+        self.misses = 0         # 需要（重新）加载才能返回的次数
+        self.reloads = 0        # 实际读取的模板文件数
+        self._mtimes = {}       # fname -> mtime_ns
+        self._entries = {}      # fname -> (name, ndarray)
+        self._items = []        # 按文件名排序的 (name, ndarray)
+        self._derived = {}      # key -> (version, value)
+        self._last_check = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        mtimes = {}
+        with os.scandir(self.pattern_dir) as it:
+            for entry in it:
+                if entry.is_file() and self.name_re.match(entry.name):
+                    mtimes[entry.name] = entry.stat().st_mtime_ns
+        return mtimes
+
+    def _load(self, fname):
+        path = os.path.join(self.pattern_dir, fname)
+        template = cv2.imread(path, self.flags)
+        if template is None:
+            return None
+        if self.preprocess is not None:
+            template = self.preprocess(template)
+        self.reloads += 1
+        return os.path.splitext(fname)[0], np.ascontiguousarray(template)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        mtimes = self._scan()
+        if mtimes == self._mtimes:
+            return False
+        for fname, mtime in mtimes.items():
+            if self._mtimes.get(fname) != mtime:
+                loaded = self._load(fname)
+                if loaded is None:
+                    self._entries.pop(fname, None)
+                else:
+                    self._entries[fname] = loaded
+        for fname in set(self._mtimes) - set(mtimes):
+            self._entries.pop(fname, None)
+        self._mtimes = mtimes
+        self._items = [self._entries[f] for f in sorted(self._entries)]
+        self.version += 1
+        return True
+
+    def templates(self):
+        """
+        返回 [(name, ndarray), ...]，name 为去掉 .png 的文件名。
+        """
+        with self._lock:
+            if self._refresh():
+                self.misses += 1
+            else:
+                self.hits += 1
+            return self._items
+
+    def derived(self, key, build):
+        """
+        缓存由模板集合计算出的派生数据（如模板矩阵），模板变化后才重新调用 build(templates)。
+        """
+        items = self.templates()
+        with self._lock:
+            cached = self._derived.get(key)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            version = self.version
+        value = build(items)
+        with self._lock:
+            self._derived[key] = (version, value)
+        return value
+
+    def stats(self):
+        return {
+            'dir': self.pattern_dir,
+            'templates': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+        }
+
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+
+def get_bank(pattern_dir, flags=cv2.IMREAD_COLOR_RGB, preprocess=None, name_re=PNG_RE):
+    """
+    按 (目录, 读取方式, 预处理, 过滤规则) 返回共享的 TemplateBank。
+    """
+    key = (os.path.normpath(pattern_dir), flags, preprocess, name_re.pattern)
+    with _banks_lock:
+        bank = _banks.get(key)
+        if bank is None:
+            bank = TemplateBank(pattern_dir, flags, preprocess, name_re)
+            _banks[key] = bank
+        return bank
+
+
+def bank_stats():
+    """
+    所有已创建模板库的命中/重载计数。
+    """
+    with _banks_lock:
+        return [bank.stats() for bank in _banks.values()]
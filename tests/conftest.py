@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 测试直接导入仓库根目录下的模块；config.py 里的模板、数据路径都相对于仓库根目录
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,12 @@
+import pytest
+import adb_controller
+from adb_controller import AdbShell
+
+
+def test_shell_start_failure_raises_runtime_error(monkeypatch):
+    monkeypatch.setattr(adb_controller, 'ADB_PATH', '/nonexistent/adb')
+    shell = AdbShell('emulator-5554', timeout=1)
+    with pytest.raises(RuntimeError):
+        shell.run('input tap 1 1')
+    assert shell.restarts == 1
+    assert not shell.alive()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from cleandata import clean, clean_by_balance, clean_special_rows, clean_verbose
+
+COLUMNS = ['a', 'b', 'c', 'd', 'e', 'f']
+
+# 均衡清洗的阈值，放宽到全正/全负行能留到 sign 步骤
+THRESHOLD = 3.5
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(7)
+    # 左边三列为正、右边三列为负，大致均衡；随机留空（0 表示没有这张卡）
+    values = rng.integers(1, 4, size=(80, len(COLUMNS))) * rng.integers(0, 2, size=(80, len(COLUMNS)))
+    values[:, 3:] *= -1
+    values[:, 0] = np.maximum(values[:, 0], 1)
+    values[:, 3] = np.minimum(values[:, 3], -1)
+    values[5] = [1, 1, 1, 1, 1, 1]        # 全正数行
+    values[9] = [-1, -1, -1, -1, -1, -1]  # 全负数行
+    values[20] = values[3]                # 重复行
+    values[31] = -values[4]               # 完全相反行
+    values[40] = [9, 0, 0, -9, 0, 0]      # 异常值（本身均衡）
+    values[47] = [3, 3, 3, 0, 0, 0]       # score 偏大
+    df = pd.DataFrame(values, columns=COLUMNS)
+    df.insert(0, 'id', np.arange(len(df)))
+    path = tmp_path / 'results.csv'
+    df.to_csv(path, index=False)
+    return tmp_path, str(path)
+
+
+def report(path, kept=None):
+    """
+    读取剔除明细；kept 为这一步输入文件各行在原始数据中的行号，用来把行号换算回原始数据。
+    """
+    df = pd.read_csv(path)
+    # 没有越界列的明细里 column 为空，整列为空时 read_csv 读成浮点
+    df['column'] = df['column'].fillna('').astype(str)
+    if kept is not None:
+        for col in ('row', 'ref'):
+            if col in df:
+                df[col] = np.where(df[col] >= 0, kept[df[col].clip(lower=0)], df[col])
+    return df
+
+
+def test_clean_matches_wrapper_chain(dataset):
+    tmp, infile = dataset
+    original = pd.read_csv(infile)
+
+    # 旧流程：三个单步清洗依次执行，每一步读上一步的输出
+    clean_by_balance(infile, str(tmp / 'step1.csv'), threshold=THRESHOLD, label_col='id')
+    clean_special_rows(str(tmp / 'step1.csv'), str(tmp / 'step2.csv'), label_col='id')
+    clean_verbose(str(tmp / 'step2.csv'), str(tmp / 'step3.csv'), label_col='id')
+    step1 = pd.read_csv(tmp / 'step1.csv')
+    step2 = pd.read_csv(tmp / 'step2.csv')
+    chained = pd.read_csv(tmp / 'step3.csv')
+    chained_report = pd.concat([
+        report(tmp / 'step1_rejected.csv'),
+        report(tmp / 'step2_rejected.csv', step1['id'].to_numpy()),
+        report(tmp / 'step3_rejected.csv', step2['id'].to_numpy()),
+    ]).sort_values('row', kind='stable').reset_index(drop=True)
+
+    counts = clean(infile, str(tmp / 'clean.csv'), threshold=THRESHOLD, label_col='id')
+    cleaned = pd.read_csv(tmp / 'clean.csv')
+    clean_report = report(tmp / 'clean_rejected.csv')
+
+    # 每一步都确实剔除了行
+    assert all(counts[stage] > 0 for stage in ('balance', 'sign', 'duplicate', 'outlier'))
+    assert len(cleaned) + len(clean_report) == len(original)
+    pd.testing.assert_frame_equal(cleaned, chained)
+    pd.testing.assert_frame_equal(clean_report, chained_report)
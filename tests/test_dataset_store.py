@@ -0,0 +1,26 @@
+import numpy as np
+from dataset_store import DatasetStore
+
+COLUMNS = ['a', 'b', 'c']
+
+
+def test_append_and_load(tmp_path):
+    store = DatasetStore.create(str(tmp_path / 'r.store'), COLUMNS)
+    store.append([1, 2, 3])
+    store.append([[4, 5, 6], [-7, 8, -9]])
+    assert store.rows == 3
+    np.testing.assert_array_equal(store.load(), [[1, 2, 3], [4, 5, 6], [-7, 8, -9]])
+
+
+def test_append_after_torn_tail(tmp_path):
+    store = DatasetStore.create(str(tmp_path / 'r.store'), COLUMNS)
+    store.append([1, 2, 3])
+    # 模拟写入中途被杀：末尾多出半行
+    with open(store.data_path, 'ab') as f:
+        f.write(b'\x07')
+    assert store.rows == 1
+    np.testing.assert_array_equal(store.load(), [[1, 2, 3]])
+
+    store.append([4, 5, 6])
+    assert store.rows == 2
+    np.testing.assert_array_equal(store.load(), [[1, 2, 3], [4, 5, 6]])
@@ -0,0 +1,16 @@
+import pytest
+from device_pool import SharedModel
+from startup import Deferred
+
+
+def test_poll_reraises_failed_load(tmp_path):
+    def load():
+        raise FileNotFoundError("no dataset")
+
+    model = SharedModel(str(tmp_path / 'missing.csv'), header=['a'], retrain=False,
+                        defer=lambda name, fn: Deferred(name, load).start())
+    with pytest.raises(FileNotFoundError):
+        model.wait()
+    assert model.ready()
+    with pytest.raises(FileNotFoundError):
+        model.poll()
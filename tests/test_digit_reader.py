@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+import recognizer
+import digit_reader
+from digit_reader import DigitReader
+from recognizer import ocr_number
+
+CROPS = [os.path.join(folder, f"{side}_num_{idx}.png")
+         for folder in ('backup', 'captures/slots') for side in ('left', 'right') for idx in (1, 2, 3)]
+
+
+class Ring:
+    def __init__(self):
+        self.flags = []
+
+    def flag(self, reason, **info):
+        self.flags.append(reason)
+
+
+@pytest.fixture(scope='module')
+def reader():
+    return DigitReader()
+
+
+@pytest.mark.parametrize('crop', CROPS)
+def test_matches_template_ocr(crop, reader, monkeypatch):
+    img = np.asarray(Image.open(crop).convert('RGB'))
+    template_ring, fast_ring = Ring(), Ring()
+    monkeypatch.setattr(recognizer, 'get_ring', lambda: template_ring)
+    expected = ocr_number(img)
+    monkeypatch.setattr(recognizer, 'get_ring', lambda: fast_ring)
+    monkeypatch.setattr(digit_reader, 'get_ring', lambda: fast_ring)
+    assert reader.read(img) == expected
+    # 两条路径对同一帧的低分判定一致
+    assert fast_ring.flags == template_ring.flags
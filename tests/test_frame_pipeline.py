@@ -0,0 +1,41 @@
+import subprocess
+import threading
+import time
+import pytest
+from frame_pipeline import FramePipeline
+
+
+def test_capture_errors_do_not_stop_the_thread():
+    calls = []
+
+    def capture():
+        calls.append(1)
+        if len(calls) <= 2:
+            raise OSError("adb went away")
+        if len(calls) == 3:
+            raise subprocess.TimeoutExpired('adb', 1)
+        return len(calls)
+
+    pipeline = FramePipeline(capture, interval=0.001, timeout=2).start()
+    try:
+        assert pipeline.get() is not None
+        assert pipeline.failures >= 3
+    finally:
+        pipeline.stop()
+
+
+def test_get_raises_when_capture_thread_died():
+    pipeline = FramePipeline(lambda: None, interval=0.001, timeout=5)
+    pipeline._thread = threading.Thread(target=lambda: None)
+    pipeline._thread.start()
+    pipeline._thread.join()
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        pipeline.get()
+    assert time.monotonic() - start < 1
+
+
+def test_get_after_stop_returns_none():
+    pipeline = FramePipeline(lambda: None, interval=0.001, timeout=5).start()
+    pipeline.stop()
+    assert pipeline.get() is None
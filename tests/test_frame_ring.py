@@ -0,0 +1,43 @@
+import logging
+from debug_writer import DebugWriter
+from frame_ring import FrameRing
+
+
+class FullWriter(DebugWriter):
+    """
+    A writer whose queue is always full.
+    """
+
+    def submit(self, output_dir, images):
+        self.rounds += 1
+        self.dropped += 1
+        return False
+
+
+def flagged_round(ring):
+    ring.record({})
+    ring.flag('ocr_low_score', score=0.5)
+    return ring.finish()
+
+
+def test_disabled_writer_skips_silently(tmp_path, caplog):
+    ring = FrameRing(dump_dir=str(tmp_path), writer=DebugWriter('off'))
+    with caplog.at_level(logging.ERROR, logger='my_logger'):
+        assert flagged_round(ring) is None
+    assert 'writer is behind' not in caplog.text
+
+
+def test_sampled_skip_is_silent(tmp_path, caplog):
+    ring = FrameRing(dump_dir=str(tmp_path), writer=DebugWriter('sampled', sample_every=2))
+    with caplog.at_level(logging.ERROR, logger='my_logger'):
+        assert flagged_round(ring) is not None
+        assert flagged_round(ring) is None
+    ring.writer.close()
+    assert 'writer is behind' not in caplog.text
+
+
+def test_full_queue_is_reported(tmp_path, caplog):
+    ring = FrameRing(dump_dir=str(tmp_path), writer=FullWriter('async'))
+    with caplog.at_level(logging.ERROR, logger='my_logger'):
+        assert flagged_round(ring) is None
+    assert 'writer is behind' in caplog.text
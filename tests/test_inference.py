@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from train_models import load_raw, augment, fit_candidate
+from inference import (compile_model, verify, check_rows, build_predictor, Evaluator, TreeEnsembleEvaluator,
+                       XGBEvaluator, ForestEvaluator, MLPEvaluator, LinearEvaluator, ModelEvaluator)
+
+DATA = 'results.csv'
+TRAIN_ROWS = 2000
+
+
+@pytest.fixture(scope='module')
+def data():
+    X, y = augment(load_raw(DATA).head(TRAIN_ROWS))
+    return X, y, check_rows(DATA)
+
+
+def fit(name, X, y, **params):
+    model, _, _, _ = fit_candidate(name, X, y, X[:10], y[:10], random_state=0)
+    if params:
+        model = model.set_params(**params).fit(X, y)
+    return model
+
+
+@pytest.mark.parametrize('name, evaluator', [
+    ('XGB', XGBEvaluator),        # missing=0.0（build_model 的默认）
+    ('RF', ForestEvaluator),
+    ('MLP', MLPEvaluator),
+    ('SGD', LinearEvaluator),
+])
+def test_matches_library_predict_proba(name, evaluator, data):
+    X, y, X_check = data
+    model = fit(name, X, y)
+    compiled = compile_model(model)
+    assert type(compiled) is evaluator
+    # 批量 predict_proba 检查全部行，predict_one 检查前 200 行
+    error, mismatches = verify(compiled, model, X_check)
+    assert error <= 1e-6
+    assert mismatches == 0
+
+
+def test_xgb_missing_zero(data):
+    X, y, X_check = data
+    compiled = compile_model(fit('XGB', X, y))
+    assert compiled.missing == 0.0
+    # 0 是缺失值：稀疏输入里缺省的 0 和稠密输入里的 0 结果相同
+    dense = X_check.toarray()
+    np.testing.assert_allclose(compiled.predict_proba(dense), compiled.predict_proba(X_check), rtol=0, atol=0)
+
+
+def test_xgb_missing_nan(data):
+    X, y, X_check = data
+    model = fit('XGB', X, y, missing=np.nan)
+    compiled = compile_model(model)
+    assert compiled.missing is None
+    # 稠密输入上与原模型一致；CSR 输入上 XGBoost 把缺省的 0 当缺失值，校验失败后回退到原模型
+    error, mismatches = verify(compiled, model, X_check.toarray())
+    assert error <= 1e-6
+    assert mismatches == 0
+    assert type(build_predictor(model, X_check)) is ModelEvaluator
+
+
+def test_incomplete_evaluator_fails_at_construction():
+    class NoLeftRule(TreeEnsembleEvaluator):
+        def _go_left_one(self, x, feature, node):
+            return x[feature] <= self.threshold[node]
+
+    with pytest.raises(TypeError):
+        NoLeftRule([], 'mean')
+    with pytest.raises(TypeError):
+        Evaluator()
@@ -0,0 +1,21 @@
+import os
+import json
+from model_registry import ModelRegistry
+
+
+def test_crashed_save_is_not_a_version(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    registry.save({'w': 1}, {'model': 'RF'})
+    # 模拟保存中途崩溃：vNNNN.tmp 里已经写了 meta.json
+    stale = tmp_path / 'v0002.tmp'
+    stale.mkdir()
+    (stale / 'meta.json').write_text(json.dumps({'version': 'v0002'}))
+    assert [m['version'] for m in registry.versions()] == ['v0001']
+    assert registry.current()['version'] == 'v0001'
+
+    meta = registry.save({'w': 2}, {'model': 'XGB'})
+    assert meta['version'] == 'v0002'
+    assert not stale.exists()
+    assert [m['version'] for m in registry.versions()] == ['v0001', 'v0002']
+    assert registry.load('v0002') == {'w': 2}
+    assert sorted(os.listdir(tmp_path)) == ['CURRENT', 'v0001', 'v0002']
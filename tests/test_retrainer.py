@@ -0,0 +1,47 @@
+from concurrent.futures import Future
+from model_registry import ModelRegistry
+from retrainer import BackgroundRetrainer
+
+
+class Model:
+    def __init__(self, name):
+        self.name = name
+
+
+def finished(result):
+    future = Future()
+    future.set_result(dict({'kind': 'incremental', 'name': 'XGB', 'candidates': {}, 'updated': True,
+                            'rows': 100, 'train_rows': 80, 'holdout_rows': 20, 'duration': 0.0},
+                           **result))
+    return future
+
+
+def make_retrainer(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    return BackgroundRetrainer(str(tmp_path / 'results.csv'), Model('current'), meta={'rows': 50},
+                               registry=registry)
+
+
+def test_tie_is_rejected(tmp_path):
+    retrainer = make_retrainer(tmp_path)
+    retrainer._future = finished({'model': Model('new'), 'new_acc': 0.6, 'current_acc': 0.6})
+    assert retrainer.poll() is None
+    assert retrainer.model.name == 'current'
+    assert retrainer.registry.versions() == []
+
+
+def test_unchanged_candidate_is_not_saved(tmp_path):
+    retrainer = make_retrainer(tmp_path)
+    retrainer._future = finished({'name': 'RF', 'model': Model('rf'), 'updated': False,
+                                  'new_acc': 0.9, 'current_acc': 0.6})
+    assert retrainer.poll() is None
+    assert retrainer.trained_rows == 50
+    assert retrainer.registry.versions() == []
+
+
+def test_better_update_is_promoted_and_saved(tmp_path):
+    retrainer = make_retrainer(tmp_path)
+    retrainer._future = finished({'model': Model('new'), 'new_acc': 0.7, 'current_acc': 0.6})
+    assert retrainer.poll().name == 'new'
+    assert retrainer.trained_rows == 80
+    assert [m['version'] for m in retrainer.registry.versions()] == ['v0001']
@@ -0,0 +1,58 @@
+import sys
+import subprocess
+import numpy as np
+from row_index import RowIndex, find_redundant, NEW, DUPLICATE, MIRROR
+from dataset_store import open_writer
+
+HEADER = ['a', 'b', 'c', 'result']
+ROWS = [[1, 0, -2, 1],
+        [0, 3, 1, 0]]
+
+
+def test_check_exact_mirrored_and_new():
+    index = RowIndex.from_values(ROWS)
+    assert index.check([1, 0, -2, 1]) == (DUPLICATE, 0)
+    assert index.check([-1, 0, 2, -1]) == (MIRROR, 0)
+    assert index.check([0, -3, -1, 0]) == (MIRROR, 1)
+    assert index.check([1, 0, 2, 1]) == (NEW, None)
+    # 同样的值出现在不同列不算重复
+    assert index.check([0, 1, -2, 1]) == (NEW, None)
+
+
+def test_add_registers_only_new_rows():
+    index = RowIndex()
+    assert index.add([1, 2, 0, 1]) == (NEW, None)
+    assert index.add([-1, -2, 0, -1]) == (MIRROR, 0)
+    assert index.add([2, 2, 0, 1]) == (NEW, None)
+    assert index.add([2, 2, 0, 1]) == (DUPLICATE, 2)
+    assert index.rows == 4
+    assert len(index) == 2
+
+
+def test_find_redundant():
+    values = np.array(ROWS + [[1, 0, -2, 1], [-1, 0, 2, -1], [0, 0, 0, 0], [0, 0, 0, 0]])
+    duplicate, mirror, first = find_redundant(values)
+    assert duplicate.tolist() == [False, False, True, False, False, True]
+    assert mirror.tolist() == [False, False, False, True, False, False]
+    assert first[[2, 3, 5]].tolist() == [0, 0, 4]
+
+
+def test_reopen_existing_dataset(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    writer = open_writer(path, HEADER, dedupe=True)
+    for row in ROWS:
+        assert writer.append(row) == (NEW, None)
+
+    reopened = open_writer(path, HEADER, dedupe=True)
+    assert reopened.index.rows == 2
+    assert reopened.append([0, -3, -1, 0]) == (MIRROR, 1)
+    assert reopened.append([1, 0, -2, 1]) == (DUPLICATE, 0)
+    assert reopened.append([5, 0, 0, 1]) == (NEW, None)
+    with open(path) as f:
+        assert f.read().splitlines() == ['a,b,c,result', '1,0,-2,1', '0,3,1,0', '5,0,0,1']
+
+
+def test_import_does_not_load_pandas():
+    code = "import sys, row_index; print('pandas' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
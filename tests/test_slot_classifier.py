@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from config import CARD_PATTERN_DIR
+from recognizer import to_rgb_array, best_match
+from image_processor import get_extractor
+from slot_classifier import SlotClassifier
+
+FOLDERS = ('backup', 'captures/slots')
+
+
+def stored_slots(folder):
+    return [Image.open(os.path.join(folder, f"{side}_{idx}_masked.png"))
+            for side in ('left', 'right') for idx in (1, 2, 3)]
+
+
+def extracted_slots(folder):
+    frame = np.asarray(Image.open(os.path.join(folder, 'full_screenshot.png')).convert('RGBA'))
+    return list(get_extractor().slots(frame))
+
+
+def loop_names(crops):
+    return [best_match(to_rgb_array(crop), CARD_PATTERN_DIR)[0] for crop in crops]
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return SlotClassifier(CARD_PATTERN_DIR, cache=False)
+
+
+@pytest.mark.parametrize('folder', FOLDERS)
+@pytest.mark.parametrize('crops', [stored_slots, extracted_slots], ids=['stored', 'extracted'])
+def test_batch_matches_loop(folder, crops, classifier):
+    crops = crops(folder)
+    assert classifier.scores(crops) is not None  # 走的是批量矩阵路径
+    assert [name for name, _ in classifier.classify(crops)] == loop_names(crops)
@@ -1,28 +1,50 @@
-import pandas as pd
+import os
+import sys
 import numpy as np
+import scipy.sparse as sp
 import time
+import copy
+from concurrent.futures import ProcessPoolExecutor
 
 from xgboost import XGBClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.neural_network import MLPClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import MaxAbsScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 from sklearn.pipeline import Pipeline
+from dataset_store import load_dataframe
+from features import to_csr, densify, memory_report
+from config import (TRAIN_PARALLEL, TRAIN_CPU_BUDGET, INCREMENTAL_XGB_ROUNDS, INCREMENTAL_EPOCHS,
+                    SPARSE_FEATURES)
+
+def load_raw(file_path):
+    """
+    读取原始数据集（每行一局，胜方为正数），不做任何处理。
+    file_path 可以是 CSV，也可以是 dataset_store 的 .store 目录（直接映射，不解析）。
+    """
+    return load_dataframe(file_path)
+
+def augment(df, sparse=SPARSE_FEATURES):
+    """
+    生成标签并做镜像扩充：原始行标签为 1，取反后的行标签为 0。
+    sparse=True 时 X 为 float32 CSR 矩阵（每行最多 6 个非零值），否则为 int64 稠密数组。
+    返回 X, y
+    """
+    y = np.repeat(np.array([1, 0], dtype=np.int64), len(df))
+    if sparse:
+        X = to_csr(df.to_numpy())
+        return sp.vstack([X, -X], format='csr'), y
+    values = df.to_numpy(dtype=np.int64)
+    return np.concatenate([values, -values]), y
 
 def load_and_process(file_path):
     """
     读取 CSV，生成标签并做镜像扩充。
     返回 X, y
     """
-    df = pd.read_csv(file_path)
-    df['label'] = 1
-    df_mirror = df.iloc[:, :-1] * -1
-    df_mirror['label'] = 0
-    df_all = pd.concat([df, df_mirror], ignore_index=True)
-    X = df_all.iloc[:, :-1].values
-    y = df_all['label'].values
-    return X, y
+    return augment(load_raw(file_path))
 
 def train_and_select_best(file_path,
                           test_size=0.1,
@@ -31,69 +53,215 @@ def train_and_select_best(file_path,
     在同一测试集上依次训练 XGB / MLP(pipeline) / RF，
     打印三者准确率，返回最佳模型（若是 MLP 就是整个 pipeline）及对应测试集。
     """
+    X, y = load_and_process(file_path)
+    return select_best(X, y, test_size, random_state)
+
+def build_model(name, random_state, n_jobs=1):
+    """
+    按名字构造候选模型；n_jobs 为分给该模型的线程数。
+    """
+    if name == 'XGB':
+        return XGBClassifier(use_label_encoder=False,
+                             eval_metric='logloss',
+                             # 0 表示没有这张卡：稀疏输入中缺省的 0 和稠密输入中的 0 按同一方式处理
+                             missing=0.0,
+                             n_jobs=n_jobs,
+                             random_state=random_state)
+    if name == 'MLP':
+        # MLP + MaxAbsScaler Pipeline
+        return Pipeline([
+            ('scaler', MaxAbsScaler()),
+            ('mlp', MLPClassifier(
+                hidden_layer_sizes=(99, 66),
+                activation='relu',
+                solver='adam',
+                alpha=1e-4,
+                batch_size=32,
+                learning_rate_init=1e-3,
+                max_iter=300,
+                early_stopping=True,
+                validation_fraction=0.1,
+                random_state=42
+            ))
+        ])
+    if name == 'RF':
+        return RandomForestClassifier(n_estimators=100,
+                                      n_jobs=n_jobs,
+                                      random_state=random_state)
+    if name == 'SGD':
+        # 线性基线（逻辑回归），支持 partial_fit 增量更新
+        return Pipeline([
+            ('scaler', MaxAbsScaler()),
+            ('sgd', SGDClassifier(loss='log_loss',
+                                  alpha=1e-4,
+                                  random_state=random_state))
+        ])
+    raise ValueError(f"unknown model: {name}")
+
+CANDIDATES = ['XGB', 'MLP', 'RF', 'SGD']
+
+# 直接用稀疏输入训练的候选模型；MLP 和 RF 在稀疏输入上反而更慢，训练前转成稠密
+SPARSE_CANDIDATES = ['XGB', 'SGD']
+
+# 支持增量更新的候选模型；RF 只在全量训练时更新
+INCREMENTAL_CANDIDATES = ['XGB', 'MLP', 'SGD']
+
+def training_config():
+    """
+    影响训练结果的配置（候选模型及其参数），用于判断已保存的模型是否与当前代码兼容。
+    """
+    return {
+        'candidates': CANDIDATES,
+        'models': {name: repr(build_model(name, 0)) for name in CANDIDATES},
+    }
+
+def split_cpu_budget(cpu_budget):
+    """
+    把 CPU 线程预算分给各候选模型：MLP 的 batch 很小，多线程 BLAS 没有收益，SGD 本身单线程，各给 1 个；
+    其余由 XGB 和 RF 平分。
+    """
+    rest = max(cpu_budget - 2, 2)
+    return {'XGB': max(rest // 2, 1), 'MLP': 1, 'RF': max(rest - rest // 2, 1), 'SGD': 1}
+
+def peak_memory_mb():
+    """
+    当前进程的峰值常驻内存（MB）。
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        # Windows 没有 resource 模块
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20
+
+def fit_candidate(name, X_train, y_train, X_test, y_test, random_state, n_jobs=1):
+    """
+    训练单个候选模型并在测试集上评估，可在子进程中运行。
+    返回 (模型, 准确率, 用时秒, 峰值内存MB)
+    """
+    from threadpoolctl import threadpool_limits
+    start = time.time()
+    if name not in SPARSE_CANDIDATES:
+        X_train, X_test = densify(X_train), densify(X_test)
+    with threadpool_limits(limits=n_jobs):
+        model = build_model(name, random_state, n_jobs)
+        model.fit(X_train, y_train)
+        acc = accuracy_score(y_test, model.predict(X_test))
+    return model, acc, time.time() - start, peak_memory_mb()
+
+def train_candidates(X, y,
+                     test_size=0.1,
+                     random_state=None,
+                     parallel=TRAIN_PARALLEL,
+                     cpu_budget=TRAIN_CPU_BUDGET):
+    """
+    拆分出测试集，训练全部候选模型，返回 (models, results, X_test, y_test)。
+    parallel=True 时各候选模型在独立进程中同时训练，按 cpu_budget 分配线程。
+    """
     if random_state is None:
         random_state = int(time.time())
+    cpu_budget = cpu_budget or os.cpu_count() or 1
 
-    # 1. 读数据并拆分
-    X, y = load_and_process(file_path)
+    # 1. 拆分
     X_train_all, X_test, y_train_all, y_test = train_test_split(
         X, y, test_size=test_size, random_state=random_state
     )
 
+    dense_bytes, actual_bytes = memory_report(X)
+    if actual_bytes < dense_bytes:
+        print(f"特征矩阵 {X.shape[0]}x{X.shape[1]}: 稀疏 {actual_bytes / 2**20:.1f}MB，"
+              f"稠密需要 {dense_bytes / 2**20:.1f}MB（节省 {1 - actual_bytes / dense_bytes:.0%}）")
+
+    # 2. 训练 XGB / MLP(pipeline) / RF
+    threads = split_cpu_budget(cpu_budget)
+    start = time.time()
+    if parallel:
+        with ProcessPoolExecutor(max_workers=len(CANDIDATES)) as pool:
+            futures = {
+                name: pool.submit(fit_candidate, name, X_train_all, y_train_all,
+                                  X_test, y_test, random_state, threads[name])
+                for name in CANDIDATES
+            }
+            fitted = {name: future.result() for name, future in futures.items()}
+    else:
+        fitted = {
+            name: fit_candidate(name, X_train_all, y_train_all,
+                                X_test, y_test, random_state, cpu_budget)
+            for name in CANDIDATES
+        }
+
     results = {}
     models  = {}
+    for name, (model, acc, seconds, memory) in fitted.items():
+        print(f"{name:<4} 准确率: {acc:.4f}  用时: {seconds:.1f}s  "
+              f"线程: {threads[name] if parallel else cpu_budget}  峰值内存: {memory:.0f}MB")
+        results[name] = acc
+        models[name]  = model
+    print(f"训练总用时: {time.time() - start:.1f}s")
+    return models, results, X_test, y_test
 
-    # 2. XGBoost
-    xgb = XGBClassifier(use_label_encoder=False,
-                        eval_metric='logloss',
-                        random_state=random_state)
-    xgb.fit(X_train_all, y_train_all)
-    y_pred = xgb.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    print(f"XGB 准确率: {acc:.4f}")
-    results['XGB'] = acc
-    models['XGB']  = xgb
-
-    # 3. MLP + MaxAbsScaler Pipeline
-    mlp_pipeline = Pipeline([
-        ('scaler', MaxAbsScaler()),
-        ('mlp', MLPClassifier(
-            hidden_layer_sizes=(99, 66),
-            activation='relu',
-            solver='adam',
-            alpha=1e-4,
-            batch_size=32,
-            learning_rate_init=1e-3,
-            max_iter=300,
-            early_stopping=True,
-            validation_fraction=0.1,
-            random_state=42
-        ))
-    ])
-    mlp_pipeline.fit(X_train_all, y_train_all)
-    y_pred = mlp_pipeline.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    print(f"MLP Pipeline 准确率: {acc:.4f}")
-    results['MLP'] = acc
-    models['MLP']  = mlp_pipeline
-
-    # 4. 随机森林
-    rf = RandomForestClassifier(n_estimators=100,
-                                random_state=random_state)
-    rf.fit(X_train_all, y_train_all)
-    y_pred = rf.predict(X_test)
-    acc = accuracy_score(y_test, y_pred)
-    print(f"RF   准确率: {acc:.4f}")
-    results['RF'] = acc
-    models['RF']  = rf
-
-    # 5. 选最佳
+def select_best(X, y,
+                test_size=0.1,
+                random_state=None,
+                parallel=TRAIN_PARALLEL,
+                cpu_budget=TRAIN_CPU_BUDGET):
+    """
+    训练全部候选模型并返回 (最佳模型, X_test, y_test)。
+    """
+    models, results, X_test, y_test = train_candidates(
+        X, y, test_size, random_state, parallel, cpu_budget)
+
+    # 选最佳
     best_name = max(results, key=results.get)
     print(f"最佳模型: {best_name}，准确率: {results[best_name]:.4f}")
 
     # 返回（模型对象, X_test, y_test）
     return models[best_name], X_test, y_test
 
+def update_candidate(name, model, X_new, y_new):
+    """
+    只用新数据增量更新一个已训练的候选模型，返回更新后的新对象（原模型不变）：
+      XGB     -- 在原有树的基础上继续提升 INCREMENTAL_XGB_ROUNDS 轮
+      MLP/SGD -- 保持已拟合的缩放器不变，对分类器做 INCREMENTAL_EPOCHS 轮 partial_fit
+    """
+    if name == 'XGB':
+        params = dict(model.get_params(), n_estimators=INCREMENTAL_XGB_ROUNDS)
+        updated = XGBClassifier(**params)
+        updated.fit(X_new, y_new, xgb_model=model.get_booster())
+        return updated
+    if name in ('MLP', 'SGD'):
+        updated = copy.deepcopy(model)
+        scaler, clf = updated.steps[0][1], updated.steps[-1][1]
+        if name == 'MLP':
+            # partial_fit 不支持 early_stopping（增量数据量很小，也不需要再切验证集）；
+            # 早停训练出的模型 best_loss_ 为 None，用训练损失曲线补上
+            clf.set_params(early_stopping=False)
+            if clf.best_loss_ is None:
+                clf.best_loss_ = min(clf.loss_curve_)
+        X_scaled = scaler.transform(X_new if name in SPARSE_CANDIDATES else densify(X_new))
+        for _ in range(INCREMENTAL_EPOCHS):
+            clf.partial_fit(X_scaled, y_new)
+        return updated
+    raise ValueError(f"model {name} does not support incremental updates")
+
+def update_candidates(models, X_new, y_new, X_hold, y_hold):
+    """
+    增量更新所有支持的候选模型，其余保持不变，并在 holdout 上评估。
+    返回 (models, results)
+    """
+    updated = {}
+    results = {}
+    for name, model in models.items():
+        start = time.time()
+        if name in INCREMENTAL_CANDIDATES:
+            model = update_candidate(name, model, X_new, y_new)
+        updated[name] = model
+        results[name] = accuracy_score(y_hold, model.predict(X_hold))
+        print(f"{name:<4} 增量更新后准确率: {results[name]:.4f}  用时: {time.time() - start:.2f}s")
+    return updated, results
+
 if __name__ == "__main__":
     best_model, X_test, y_test = train_and_select_best("results.csv")
     # 如果 best_model 是 MLP，那么它就是一个 pipeline，调用 predict 会自动先 scale 再预测